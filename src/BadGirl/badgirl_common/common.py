@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from collections.abc import Callable, Sequence
+from collections.abc import Callable, Mapping
 from functools import partial
 from pathlib import Path
 
@@ -22,10 +22,9 @@ from vstools import (
     Keyframes,
     PlanesT,
     Sar,
-    VideoPackets,
+    ScenePacketStats,
     depth,
     finalize_clip,
-    get_prop,
     insert_clip,
     replace_ranges,
     set_output,
@@ -35,6 +34,9 @@ from vstools import (
 import sgtfunc
 from badgirl_common.sources import Source, sources
 
+OP_MERGE_LENGTH = 2156
+"""Number of frames of every episode's OP that go into the OP inter-merge."""
+
 
 class Placebo2(Placebo):
     @inject_self
@@ -52,10 +54,31 @@ class Placebo2(Placebo):
         return super().deband(clip, radius, thr, iterations, grain, dither)
 
 
+def choose_source(stats: Mapping[str, ScenePacketStats]) -> str:
+    if "ADN" not in stats or "AMZN" not in stats:
+        return next(iter(stats))
+
+    adn_avg = stats["ADN"]["PktSceneAvgSize"]
+    amzn_avg = stats["AMZN"]["PktSceneAvgSize"]
+
+    # Without usable sizes there's nothing to compare.
+    if adn_avg <= 0 or amzn_avg <= 0:
+        return "AMZN"
+
+    if abs(adn_avg - amzn_avg) / adn_avg < 0.1:
+        adn_max = stats["ADN"]["PktSceneMaxSize"]
+        amzn_max = stats["AMZN"]["PktSceneMaxSize"]
+
+        return "ADN" if adn_max > amzn_max else "AMZN"
+
+    return "ADN" if adn_avg > amzn_avg else "AMZN"
+
+
 class FilterchainResults(BaseModel):
     src: vs.VideoNode
     final: vs.VideoNode
     audio_file: src_file
+    keyframes: Keyframes
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
@@ -67,6 +90,7 @@ def filterchain(
     force_adn: FrameRangeN | FrameRangesN | None = None,
     force_amzn: FrameRangeN | FrameRangesN | None = None,
     post_double: Callable[[vs.VideoNode], vs.VideoNode] | None = None,
+    profiler: sgtfunc.StageProfiler | None = None,
 ) -> FilterchainResults:
     adn_file = src_file(str(source.adn_path), preview_sourcefilter=SourceFilter.BESTSOURCE)
     amzn_file = src_file(str(source.amzn_path), preview_sourcefilter=SourceFilter.BESTSOURCE)
@@ -86,22 +110,16 @@ def filterchain(
     adn = keyframes.to_clip(adn, scene_idx_prop=True)
     amzn = keyframes.to_clip(amzn, scene_idx_prop=True)
 
-    adn = VideoPackets.from_video(source.adn_path).apply_props(adn, keyframes)
-    amzn = VideoPackets.from_video(source.amzn_path).apply_props(amzn, keyframes)
-
-    def scene_select(n: int, f: Sequence[vs.VideoFrame]) -> vs.VideoNode:
-        adn_avg = get_prop(f[0], "PktSceneAvgSize", float, default=1)
-        amzn_avg = get_prop(f[1], "PktSceneAvgSize", float, default=1)
-
-        if abs(adn_avg - amzn_avg) / adn_avg < 0.1:
-            adn_max = get_prop(f[0], "PktSceneMaxSize", int, default=1)
-            amzn_max = get_prop(f[1], "PktSceneMaxSize", int, default=1)
-
-            return adn if adn_max > amzn_max else amzn
-
-        return adn if adn_avg > amzn_avg else amzn
-
-    src = adn.std.FrameEval(partial(scene_select), clip_src=[adn, amzn], prop_src=[adn, amzn])
+    # Rank the sources per scene from their packet sizes up front, so that only
+    # the chosen one gets decoded.
+    src = sgtfunc.SceneSourceSelector.from_packets(
+        {"ADN": adn, "AMZN": amzn},
+        {"ADN": source.adn_path, "AMZN": source.amzn_path},
+        keyframes,
+        choose_source,
+        key="badgirl choose_source",
+        num_frames=min_frames,
+    ).clip()
     if force_adn:
         src = replace_ranges(src, adn, force_adn)
     if force_amzn:
@@ -112,21 +130,19 @@ def filterchain(
         src = replace_ranges(src, amzn, source.op)
 
         # OP inter-merge
-        ops = [
-            src_file(str(x.amzn_path), trim=x.op, preview_sourcefilter=SourceFilter.BESTSOURCE).init_cut()[:2156]
-            for x in sources.values()
-            if x.op
-        ]
-        src = insert_clip(
-            src,
-            frequency_merge(*ops, lowpass=lambda clip: DFTTest().denoise(clip)),
-            source.op[0],
-        )
+        src = insert_clip(src, merged_op(), source.op[0])
     if source.ed:
         src = replace_ranges(src, amzn, source.ed)
 
+    checkpoint = partial(_checkpoint, source=source, force_adn=force_adn, force_amzn=force_amzn)
+    stage = (profiler or sgtfunc.StageProfiler(enabled=False)).stage
+
     # Denoise
-    denoised = sgtfunc.denoise(src, sigma=0.65, strength=0.3, thSAD=133, tr=3)
+    denoised = checkpoint(
+        sgtfunc.denoise(stage(src, "source"), sigma=0.65, strength=0.3, thSAD=133, tr=3),
+        "denoise sigma=0.65 strength=0.3 thSAD=133 tr=3",
+    )
+    denoised = stage(denoised, "denoise")
 
     # Rescale
     rs = Rescale(depth(denoised, 32), 880.9, Catrom, upscaler=Waifu2x.Cunet, crop=(1, 1, 0, 0))
@@ -134,14 +150,25 @@ def filterchain(
         rs.doubled = post_double(rs.doubled)
     rs.default_credit_mask()
     rs.default_line_mask()
-    rescaled = replace_ranges(depth(rs.upscale, 16), denoised, no_descale)
+    upscaled = depth(rs.upscale, 16)
+    if not post_double:
+        # `post_double` can't be fingerprinted, so only checkpoint without it.
+        upscaled = checkpoint(
+            upscaled,
+            "denoise sigma=0.65 strength=0.3 thSAD=133 tr=3 "
+            "rescale height=880.9 kernel=Catrom upscaler=Waifu2x.Cunet crop=(1, 1, 0, 0)",
+        )
+    rescaled = replace_ranges(stage(upscaled, "rescale"), denoised, no_descale)
     rescaled = Sar(1, 1).apply(rescaled)
 
     # Deband
-    debanded = pfdeband(rescaled, debander=Placebo2, thr=1.6)
+    debanded = stage(pfdeband(rescaled, debander=Placebo2, thr=1.6), "deband")
 
     # Regrain
-    grained = adaptive_grain(debanded, strength=[1.99, 0.4], size=3.16, temporal_average=50, seed=258000, **ntype4)
+    grained = stage(
+        adaptive_grain(debanded, strength=[1.99, 0.4], size=3.16, temporal_average=50, seed=258000, **ntype4),
+        "grain",
+    )
 
     final = finalize_clip(grained)
 
@@ -151,7 +178,57 @@ def filterchain(
         set_output(src, "src", scenes=keyframes)
         set_output(final, "final", scenes=keyframes)
 
-    return FilterchainResults(src=src, final=final, audio_file=adn_file)
+    return FilterchainResults(src=src, final=final, audio_file=adn_file, keyframes=keyframes)
+
+
+def merged_op() -> vs.VideoNode:
+    """
+    Frequency merge of the OP of every episode that has one. It is rendered once
+    per season to a lossless checkpoint that all episodes read back, and is
+    invalidated by changes to the OPs in `sources`, to their files or to the
+    merge's parameters.
+    """
+
+    op_sources = [x for x in sources.values() if x.op]
+    ops = [
+        src_file(str(x.amzn_path), trim=x.op, preview_sourcefilter=SourceFilter.BESTSOURCE).init_cut()[:OP_MERGE_LENGTH]
+        for x in op_sources
+    ]
+    merged = frequency_merge(*ops, lowpass=lambda clip: DFTTest().denoise(clip))
+
+    return sgtfunc.checkpoint(
+        merged,
+        f"op merge ops={[x.op for x in op_sources]} length={OP_MERGE_LENGTH} lowpass=DFTTest",
+        [str(x.amzn_path) for x in op_sources],
+        render=not is_preview(),
+    )
+
+
+def _checkpoint(
+    clip: vs.VideoNode,
+    key: str,
+    *,
+    source: Source,
+    force_adn: FrameRangeN | FrameRangesN | None,
+    force_amzn: FrameRangeN | FrameRangesN | None,
+) -> vs.VideoNode:
+    """
+    `sgtfunc.checkpoint()` of a filterchain stage, keyed by everything that goes
+    into the source selection on top of `key`. Checkpoints are only rendered
+    outside of previews.
+    """
+
+    # The OP inter-merge pulls in every episode's AMZN file.
+    source_files = [source.adn_path, source.amzn_path]
+    if source.op:
+        source_files += [x.amzn_path for x in sources.values() if x.op]
+
+    return sgtfunc.checkpoint(
+        clip,
+        f"force_adn={force_adn} force_amzn={force_amzn} op={source.op} ed={source.ed} {key}",
+        [str(x) for x in source_files],
+        render=not is_preview(),
+    )
 
 
 def mux(
@@ -159,6 +236,10 @@ def mux(
     episode: str,
     source: Source,
     filterchain_results: FilterchainResults,
+    workers: int = 1,
+    incremental: bool = False,
+    chunked: bool = False,
+    tune: bool = False,
 ) -> Path | str:
     setup = Setup(episode)
     assert setup.work_dir
@@ -183,13 +264,32 @@ def mux(
         zones.append((source.op[0], source.op[1], 1.2))
     if source.ed is not None:
         zones.append((source.ed[0], source.ed[1], 1.2))
-    video = (
-        VideoFile(encoded)
-        if encoded.exists()
-        else x265(settings, zones=zones, qp_clip=filterchain_results.src, resumable=False).encode(
-            filterchain_results.final
-        )
-    )
+    if encoded.exists() and not incremental:
+        video = VideoFile(encoded)
+    else:
+        if tune:
+            # Tuned once per host, the other episodes reuse the settings.
+            sgtfunc.autotune(filterchain_results.final)
+        if workers > 1 or incremental or chunked:
+            # Encoded in chunks split at the scene changes, which resumes after
+            # a crash and runs `workers` encoders in parallel. With
+            # `incremental`, an existing encode only has the chunks with
+            # changed frames redone. The output isn't identical to that of a
+            # single encode.
+            video = sgtfunc.encode_chunked(
+                x265(settings, zones=zones, resumable=False),
+                filterchain_results.final,
+                filterchain_results.keyframes,
+                encoded,
+                workers=workers,
+                # About 100 seconds per chunk, to lose little on a crash.
+                chunks=max(2 * workers, -(-filterchain_results.final.num_frames // 2400)),
+                incremental=incremental,
+            )
+        else:
+            video = x265(settings, zones=zones, qp_clip=filterchain_results.src, resumable=False).encode(
+                filterchain_results.final
+            )
 
     return vsmux(
         video.to_track("WEB encode by sgt", "jpn", default=True, forced=False, args=["--deterministic", "258000"]),
@@ -6,11 +6,12 @@ from vskernels import Point
 from vsmasktools import CustomMaskFromRanges
 from vspreview import is_preview
 from vssource import source
-from vstools import Matrix, core, vs
+from vstools import Matrix, vs
 
+import sgtfunc
 from dededede_common import filterchain, mux, sources
 
-core.set_affinity(22, 2 << 13)
+sgtfunc.tune_core(22, 2 << 13)
 
 
 EPISODE = "01"
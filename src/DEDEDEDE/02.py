@@ -1,14 +1,18 @@
 from __future__ import annotations
 
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from vsmasktools import CustomMaskFromRanges
 from vspreview import is_preview
-from vstools import core, vs
 
+import sgtfunc
 from dededede_common import filterchain, mux, sources
 
-core.set_affinity(22, 2 << 13)
+if TYPE_CHECKING:
+    from vstools import vs
+
+sgtfunc.tune_core(22, 2 << 13)
 
 
 EPISODE = "02"
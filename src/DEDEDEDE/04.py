@@ -2,11 +2,12 @@ from __future__ import annotations
 
 from vsmasktools import BoundingBox
 from vspreview import is_preview
-from vstools import core, replace_ranges, vs
+from vstools import replace_ranges, vs
 
+import sgtfunc
 from dededede_common import filterchain, mux, sources
 
-core.set_affinity(22, 2 << 13)
+sgtfunc.tune_core(22, 2 << 13)
 
 
 EPISODE = "04"
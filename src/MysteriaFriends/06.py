@@ -22,9 +22,10 @@ from vsmuxtools import (
 from vsrgtools import contrasharpening
 from vstools import FieldBased, core, finalize_clip, replace_ranges
 
+import sgtfunc
 from sgtfunc import denoise
 
-core.set_affinity(max_cache=17180)
+sgtfunc.tune_core(max_cache=17180)
 
 # Frame range (inclusive) of the ED.
 ED = (15610, 16566)
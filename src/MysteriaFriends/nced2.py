@@ -19,9 +19,10 @@ from vsmuxtools import (
 from vsrgtools import contrasharpening
 from vstools import FieldBased, core, finalize_clip
 
+import sgtfunc
 from sgtfunc import denoise
 
-core.set_affinity(max_cache=17180)
+sgtfunc.tune_core(max_cache=17180)
 
 JPNBD = src_file(Path(r"X:\path\to\JPBD\Volume2\BDMV\STREAM\00012.m2ts").resolve(True))
 src = JPNBD.init_cut(field_based=FieldBased.PROGRESSIVE)
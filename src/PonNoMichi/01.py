@@ -1,4 +1,3 @@
-from functools import partial
 from pathlib import Path
 
 from vodesfunc import DescaleTarget, Waifu2x_Doubler, adaptive_grain, ntype4
@@ -22,7 +21,6 @@ from vsscale import descale_detail_mask
 from vssource import source
 from vstools import (
     Keyframes,
-    core,
     depth,
     finalize_clip,
     replace_ranges,
@@ -32,7 +30,7 @@ from vstools import (
 
 import sgtfunc
 
-core.set_affinity(22, 2 << 13)
+sgtfunc.tune_core(22, 2 << 13)
 
 OP = (10093, 12251)
 ED = (32584, 34740)
@@ -101,58 +99,37 @@ adn_file = src_file(
     r"X:\path\to\Pon no Michi - 01 (ADN 1080p).mkv",
     idx=source,
 )
-adn = adn_file.init_cut()
-adn = Keyframes.unique(adn, "01 ADN").to_clip(adn, scene_idx_prop=True)
-adn = adn + adn.std.BlankClip(length=len(amzn) - len(adn))
-
-bglobal = src_file(
+bglobal_file = src_file(
     r"X:\path\to\Pon no Michi - 01 (B-Global HEVC 1080p).mkv",
     idx=source,
 )
-bglobal = bglobal.init_cut()
-bglobal = Keyframes.unique(bglobal, "01 BGLOBAL").to_clip(bglobal, scene_idx_prop=True)
-
-merged = frequency_merge([adn, amzn, bglobal]).std.SetFrameProp("SceneMerged", True)
-
-
-def scene_select(
-    n: int,
-    keyframes: Keyframes,
-    adn_scenes: frozenset[int],
-    amzn_scenes: frozenset[int],
-    bglobal_scenes: frozenset[int],
-    adn: vs.VideoNode,
-    amzn: vs.VideoNode,
-    bglobal: vs.VideoNode,
-    merged: vs.VideoNode,
-) -> vs.VideoNode:
-    scene_idx = keyframes.scenes.indices[n]
-    if scene_idx in adn_scenes:
-        return adn
-    elif scene_idx in amzn_scenes:
-        return amzn
-    elif scene_idx in bglobal_scenes:
-        return bglobal
-    else:
-        return merged
-
-
-selected = amzn.std.FrameEval(
-    # All this stuff is passed as arguments in order to please vspreview
-    # reloading.
-    partial(
-        scene_select,
-        keyframes=keyframes,
-        adn_scenes=ADN_SCENES,
-        amzn_scenes=AMZN_SCENES,
-        bglobal_scenes=BGLOBAL_SCENES,
-        adn=adn,
-        amzn=amzn,
-        bglobal=bglobal,
-        merged=merged,
-    ),
-    clip_src=[amzn, adn, bglobal, merged],
-)
+
+
+def load_adn() -> vs.VideoNode:
+    adn = adn_file.init_cut()
+    adn = Keyframes.unique(adn, "01 ADN").to_clip(adn, scene_idx_prop=True)
+    return adn + adn.std.BlankClip(length=len(amzn) - len(adn))
+
+
+def load_bglobal() -> vs.VideoNode:
+    bglobal = bglobal_file.init_cut()
+    return Keyframes.unique(bglobal, "01 BGLOBAL").to_clip(bglobal, scene_idx_prop=True)
+
+
+adn = sgtfunc.LazyClip(load_adn)
+bglobal = sgtfunc.LazyClip(load_bglobal)
+
+# Only built, and only pulls from its inputs, for the scenes routed to it.
+merged = sgtfunc.LazyClip(lambda: frequency_merge([adn.clip, amzn, bglobal.clip]).std.SetFrameProp("SceneMerged", True))
+
+
+selected = sgtfunc.SceneSourceSelector.from_sets(
+    {"ADN": adn, "AMZN": amzn, "B-Global": bglobal, "merged": merged},
+    keyframes,
+    {"ADN": ADN_SCENES, "AMZN": AMZN_SCENES, "B-Global": BGLOBAL_SCENES},
+    default="merged",
+    num_frames=amzn.num_frames,
+).clip()
 selected = replace_ranges(selected, amzn, GUEST_ILLUSTRATION)
 
 # Deblock
@@ -193,9 +170,9 @@ final = finalize_clip(grained)
 
 
 if is_preview():
-    set_output(adn, "ADN")
+    set_output(adn.clip, "ADN")
     set_output(amzn, "AMZN")
-    set_output(bglobal, "B-Global (HEVC)")
+    set_output(bglobal.clip, "B-Global (HEVC)")
     set_output(final, "filter")
 else:
     setup = Setup("01")
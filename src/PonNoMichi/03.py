@@ -20,19 +20,16 @@ from vsscale import descale_detail_mask
 from vssource import source
 from vstools import (
     Keyframes,
-    SceneBasedDynamicCache,
-    core,
     depth,
     finalize_clip,
     join,
     replace_ranges,
     set_output,
-    vs,
 )
 
 import sgtfunc
 
-core.set_affinity(22, 2 << 13)
+sgtfunc.tune_core(22, 2 << 13)
 
 EPISODE = "03"
 OP = (984, 3140)
@@ -76,7 +73,7 @@ adn_file = src_file(
     r"X:\path\to\Pon no Michi - 03 (ADN 1080p).mkv",
     idx=source,
 )
-adn = adn_file.init_cut().std.SetFrameProp("SceneSource", data="ADN")
+adn = sgtfunc.LazyClip(lambda: adn_file.init_cut().std.SetFrameProp("SceneSource", data="ADN"))
 
 amzn_file = src_file(
     r"X:\path\to\Pon no Michi - 03 (Amazon dAnime CBR 1080p).mkv",
@@ -90,7 +87,7 @@ bglobal_file = src_file(
     r"X:\path\to\Pon no Michi - 03 (B-Global HEVC 1080p).mkv",
     idx=source,
 )
-bglobal = bglobal_file.init_cut().std.SetFrameProp("SceneSource", data="B-Global")
+bglobal = sgtfunc.LazyClip(lambda: bglobal_file.init_cut().std.SetFrameProp("SceneSource", data="B-Global"))
 
 bglobal_4k_file = src_file(
     r"X:\path\to\Pon no Michi - 03 (B-Global 2160p).mkv",
@@ -103,25 +100,22 @@ bglobal_4k_hevc_file = src_file(
     r"X:\path\to\Pon no Michi - 03 (B-Global HEVC 2160p).mkv",
     idx=source,
 )
-bglobal_4k_hevc = bglobal_4k_hevc_file.init_cut()
-bglobal_4k_hevc = Hermite(linear=True).scale(bglobal_4k_hevc, 1920, 1080)
+bglobal_4k_hevc = sgtfunc.LazyClip(lambda: Hermite(linear=True).scale(bglobal_4k_hevc_file.init_cut(), 1920, 1080))
 
 
-merged = frequency_merge([adn, amzn, bglobal], planes=0).std.SetFrameProp("SceneSource", data="merged")
-
-
-class PonNoMichiScenes(SceneBasedDynamicCache):
-    def get_clip(self, scene_idx: int) -> vs.VideoNode:
-        if scene_idx in ADN_SCENES:
-            return adn
-        if scene_idx in AMZN_SCENES:
-            return amzn
-        if scene_idx in BGLOBAL_SCENES:
-            return bglobal
-        return merged
+# Only built, and only pulls from its inputs, for the scenes routed to it.
+merged = sgtfunc.LazyClip(
+    lambda: frequency_merge([adn.clip, amzn, bglobal.clip], planes=0).std.SetFrameProp("SceneSource", data="merged")
+)
 
 
-selected = PonNoMichiScenes.from_clip(amzn, keyframes)
+selected = sgtfunc.SceneSourceSelector.from_sets(
+    {"ADN": adn, "AMZN": amzn, "B-Global": bglobal, "merged": merged},
+    keyframes,
+    {"ADN": ADN_SCENES, "AMZN": AMZN_SCENES, "B-Global": BGLOBAL_SCENES},
+    default="merged",
+    num_frames=amzn.num_frames,
+).clip()
 selected = keyframes.to_clip(selected, scene_idx_prop=True)
 
 
@@ -158,11 +152,11 @@ final = finalize_clip(grained)
 
 
 if is_preview():
-    set_output(adn, "ADN")
+    set_output(adn.clip, "ADN")
     set_output(amzn, "AMZN")
-    set_output(bglobal, "B-Global")
+    set_output(bglobal.clip, "B-Global")
     set_output(bglobal_4k, "B-Global (4k)")
-    set_output(bglobal_4k_hevc, "B-Global (HEVC 4k)")
+    set_output(bglobal_4k_hevc.clip, "B-Global (HEVC 4k)")
     set_output(final, "filter")
 else:
     setup = Setup(EPISODE)
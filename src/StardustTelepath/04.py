@@ -22,11 +22,11 @@ from vsmuxtools import (
 from vspreview import is_preview
 from vsscale import FSRCNNXShader
 from vssource import source
-from vstools import Sar, core, finalize_clip
+from vstools import Sar, finalize_clip
 
 import sgtfunc
 
-core.set_affinity(22, 2 << 13)
+sgtfunc.tune_core(22, 2 << 13)
 
 OP = (2182, 4339)
 ED = (31048, 33204)
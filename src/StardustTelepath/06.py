@@ -24,11 +24,11 @@ from vsmuxtools import (
 from vspreview import is_preview
 from vsscale import FSRCNNXShader
 from vssource import source
-from vstools import Sar, core, finalize_clip, replace_ranges
+from vstools import Sar, finalize_clip, replace_ranges
 
 import sgtfunc
 
-core.set_affinity(22, 2 << 13)
+sgtfunc.tune_core(22, 2 << 13)
 
 OP = (1128, 3286)
 ED = (31074, 33231)
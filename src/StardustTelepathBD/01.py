@@ -28,7 +28,7 @@ from vstools import Keyframes, core, finalize_clip, replace_ranges
 
 import sgtfunc
 
-core.set_affinity(22, 2 << 13)
+sgtfunc.tune_core(22, 2 << 13)
 
 
 EPISODE = "01"
@@ -24,11 +24,11 @@ from vspreview import is_preview
 from vsrgtools import bilateral
 from vsscale import Waifu2x
 from vssource import source
-from vstools import Keyframes, core, finalize_clip, replace_ranges
+from vstools import Keyframes, finalize_clip, replace_ranges
 
 import sgtfunc
 
-core.set_affinity(22, 2 << 13)
+sgtfunc.tune_core(22, 2 << 13)
 
 
 EPISODE = "02"
@@ -21,9 +21,11 @@ from vspreview import is_preview
 from vsrgtools import bilateral
 from vsscale import Waifu2x
 from vssource import source
-from vstools import core, finalize_clip
+from vstools import finalize_clip
 
-core.set_affinity(22, 2 << 13)
+import sgtfunc
+
+sgtfunc.tune_core(22, 2 << 13)
 
 
 jpnbd = src_file(
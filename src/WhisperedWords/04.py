@@ -32,7 +32,7 @@ from vstools import FieldBased, core, depth, finalize_clip, iterate
 
 import sgtfunc
 
-core.set_affinity(16, 17180)
+sgtfunc.tune_core(16, 17180)
 
 # Frame range (inclusive) of the OP.
 OP = (696, 2855)
@@ -28,11 +28,11 @@ from vsmuxtools import (
 from vspreview import is_preview
 from vsscale import descale_detail_mask
 from vssource import source
-from vstools import FieldBased, core, finalize_clip
+from vstools import FieldBased, finalize_clip
 
 import sgtfunc
 
-core.set_affinity(16, 17180)
+sgtfunc.tune_core(16, 17180)
 
 # Frame range (inclusive) of the ED.
 ED = (31056, 33215)
@@ -24,11 +24,11 @@ from vsmuxtools import (
 )
 from vspreview import is_preview
 from vssource import source
-from vstools import FieldBased, core, finalize_clip
+from vstools import FieldBased, finalize_clip
 
 import sgtfunc
 
-core.set_affinity(16, 17180)
+sgtfunc.tune_core(16, 17180)
 
 JPNBD = src_file(
     r"X:\path\to\JPNBD\Disc2\BDMV\STREAM\00020.m2ts",
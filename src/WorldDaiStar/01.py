@@ -25,7 +25,7 @@ from vstools import Keyframes, core, depth, finalize_clip, set_output
 
 import sgtfunc
 
-core.set_affinity(22, 2 << 13)
+sgtfunc.tune_core(22, 2 << 13)
 
 
 EPISODE = "01"
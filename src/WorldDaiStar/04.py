@@ -23,7 +23,6 @@ from vsscale import descale_detail_mask
 from vssource import source
 from vstools import (
     Keyframes,
-    core,
     depth,
     finalize_clip,
     get_y,
@@ -34,7 +33,7 @@ from vstools import (
 
 import sgtfunc
 
-core.set_affinity(22, 2 << 13)
+sgtfunc.tune_core(22, 2 << 13)
 
 
 EPISODE = "04"
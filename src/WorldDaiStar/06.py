@@ -21,11 +21,11 @@ from vsmuxtools import (
 from vspreview import is_preview
 from vsscale import descale_detail_mask
 from vssource import source
-from vstools import Keyframes, core, depth, finalize_clip, set_output
+from vstools import Keyframes, depth, finalize_clip, set_output
 
 import sgtfunc
 
-core.set_affinity(22, 2 << 13)
+sgtfunc.tune_core(22, 2 << 13)
 
 
 EPISODE = "06"
@@ -16,11 +16,11 @@ from vsmuxtools import (
 )
 from vspreview import is_preview
 from vssource import source
-from vstools import core, depth, finalize_clip, set_output
+from vstools import depth, finalize_clip, set_output
 
 import sgtfunc
 
-core.set_affinity(22, 2 << 13)
+sgtfunc.tune_core(22, 2 << 13)
 
 
 jpnbd = src_file(
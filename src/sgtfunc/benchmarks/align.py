@@ -0,0 +1,83 @@
+# Compares `sgtfunc.align()` against diffing the clips with PlaneStats for
+# every candidate offset, on a synthetic clip with leading frames, a dropped
+# frame and a duplicated frame, and checks that both find the same offset.
+#
+#   python src/sgtfunc/benchmarks/align.py
+
+from time import perf_counter
+
+from lazylist import synthetic_clip
+from vstools import core, vs
+
+import sgtfunc
+
+NUM_FRAMES = 8_000
+LEADING_FRAMES = 24
+DROPPED_FRAME = 3_000
+DUPLICATED_FRAME = 6_000
+MAX_OFFSET = 48
+
+
+def shifted(clip: vs.VideoNode) -> vs.VideoNode:
+    """
+    `clip` with leading black frames, one frame dropped and another one
+    duplicated, like a source from another service.
+    """
+
+    return core.std.Splice(
+        [
+            clip.std.BlankClip(length=LEADING_FRAMES, keep=True),
+            clip[:DROPPED_FRAME],
+            clip[DROPPED_FRAME + 1 : DUPLICATED_FRAME],
+            clip[DUPLICATED_FRAME],
+            clip[DUPLICATED_FRAME:],
+        ]
+    )
+
+
+def naive_offset(reference: vs.VideoNode, other: vs.VideoNode, max_offset: int) -> int:
+    """
+    Renders the average difference of the whole overlap for every offset and
+    picks the smallest one.
+    """
+
+    best: tuple[float, int] | None = None
+    for offset in range(-max_offset, max_offset + 1):
+        a = reference[max(-offset, 0) :]
+        b = other[max(offset, 0) :]
+        length = min(a.num_frames, b.num_frames)
+
+        stats = core.std.PlaneStats(a[:length], b[:length])
+        diff = sum(float(f.props["PlaneStatsDiff"]) for f in stats.frames()) / length  # type: ignore[arg-type]
+
+        if best is None or diff < best[0]:
+            best = (diff, offset)
+
+    assert best is not None
+    return best[1]
+
+
+def main() -> None:
+    reference = synthetic_clip(NUM_FRAMES)
+    other = shifted(reference)
+
+    start = perf_counter()
+    plan = sgtfunc.align(reference, other, max_offset=MAX_OFFSET)
+    fast = perf_counter() - start
+
+    start = perf_counter()
+    offset = naive_offset(reference, other, MAX_OFFSET)
+    naive = perf_counter() - start
+
+    print(plan)
+    print(f"frames:  {reference.num_frames}")
+    print(f"offsets: {2 * MAX_OFFSET + 1}")
+    print(f"naive:   {naive:.2f}s")
+    print(f"align:   {fast:.2f}s ({naive / fast:.2f}x)")
+
+    assert plan.segments[0].offset == offset == LEADING_FRAMES
+    assert [s.offset for s in plan.segments] == [LEADING_FRAMES, LEADING_FRAMES - 1, LEADING_FRAMES]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Compares reading an expensive intermediate clip back from a `RawFrameStore`
+# and from an FFV1 checkpoint against rendering it again, and checks that both
+# caches are lossless.
+#
+#   python src/sgtfunc/benchmarks/framestore.py
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from vstools import clip_async_render, core, vs
+
+import sgtfunc
+
+NUM_FRAMES = 2_000
+SEED = 20202020
+
+
+def expensive_clip(num_frames: int = NUM_FRAMES) -> vs.VideoNode:
+    """
+    1080p 16-bit clip with grain, if the plugin is available, under a stack of
+    blurs to stand in for a slow filter.
+    """
+
+    clip = core.std.BlankClip(format=vs.YUV420P16, width=1920, height=1080, length=num_frames, keep=True)
+    if hasattr(core, "grain"):
+        clip = clip.grain.Add(var=20, uvar=5, seed=SEED)
+
+    for _ in range(8):
+        clip = clip.std.BoxBlur(hradius=4, vradius=4)
+
+    return clip
+
+
+def timed_render(clip: vs.VideoNode) -> float:
+    start = perf_counter()
+    clip_async_render(clip)
+    return perf_counter() - start
+
+
+def assert_identical(a: vs.VideoNode, b: vs.VideoNode) -> None:
+    diff = core.std.Expr([a, b], "x y - abs").std.PlaneStats()
+    for f in diff.frames():
+        assert f.props["PlaneStatsMax"] == 0, f"frame {f.props.get('_FrameNumber')} differs"
+
+
+def main() -> None:
+    clip = expensive_clip()
+
+    with TemporaryDirectory() as temp_dir:
+        rerender = timed_render(clip)
+
+        start = perf_counter()
+        store = sgtfunc.RawFrameStore(Path(temp_dir, "clip.raw"), clip)
+        store.fill()
+        raw_fill = perf_counter() - start
+        raw_read = timed_render(store.clip())
+        assert_identical(clip, store.clip())
+
+        print(f"frames:      {clip.num_frames}")
+        print(f"re-render:   {rerender:.2f}s")
+        print(f"raw fill:    {raw_fill:.2f}s ({store.file_size / 1024**3:.1f} GiB)")
+        print(f"raw read:    {raw_read:.2f}s ({rerender / raw_read:.2f}x)")
+
+        if hasattr(core, "bs"):
+            start = perf_counter()
+            ffv1 = sgtfunc.checkpoint(clip, "benchmark", cache_dir=temp_dir)
+            ffv1_fill = perf_counter() - start
+            ffv1_read = timed_render(sgtfunc.checkpoint(clip, "benchmark", cache_dir=temp_dir))
+            assert_identical(clip, ffv1)
+
+            ffv1_size = sum(p.stat().st_size for p in Path(temp_dir).glob("*.mkv"))
+            print(f"ffv1 encode: {ffv1_fill:.2f}s ({ffv1_size / 1024**3:.1f} GiB)")
+            print(f"ffv1 read:   {ffv1_read:.2f}s ({rerender / ffv1_read:.2f}x)")
+
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# Compares `sgtfunc.lazylist()` against the previous FrameEval-based
+# implementation on a synthetic clip and checks that both pick the same frames.
+#
+#   python src/sgtfunc/benchmarks/lazylist.py
+
+import random
+from functools import partial
+from time import perf_counter
+
+from vstools import clip_async_render, core, get_prop, vs
+
+import sgtfunc
+
+NUM_FRAMES = 34_000
+SCENE_LENGTH = (12, 240)
+SEED = 20202020
+
+
+def synthetic_clip(num_frames: int = NUM_FRAMES) -> vs.VideoNode:
+    """
+    Splices flat scenes of random brightness together, with grain on top if
+    the plugin is available.
+    """
+
+    rng = random.Random(SEED)
+    scenes: list[vs.VideoNode] = []
+    remaining = num_frames
+    while remaining > 0:
+        length = min(rng.randint(*SCENE_LENGTH), remaining)
+        luma = rng.randint(16, 235)
+        scenes.append(
+            core.std.BlankClip(
+                format=vs.YUV420P8, width=640, height=360, length=length, color=[luma, 128, 128], keep=True
+            )
+        )
+        remaining -= length
+
+    clip = core.std.Splice(scenes)
+    if hasattr(core, "grain"):
+        clip = clip.grain.Add(var=20, uvar=0, seed=SEED)
+
+    return clip
+
+
+def legacy_lazylist(
+    clip: vs.VideoNode,
+    dark_frames: int = 8,
+    light_frames: int = 4,
+    seed: int = 20202020,
+    diff_thr: int = 15,
+    d_start_thresh: float = 0.075000,
+    d_end_thresh: float = 0.380000,
+    l_start_thresh: float = 0.450000,
+    l_end_thresh: float = 0.750000,
+) -> list[int]:
+    dark = []
+    light = []
+
+    def checkclip(n: int, f: vs.VideoFrame, clip: vs.VideoNode) -> vs.VideoNode:
+        avg: float = get_prop(f, "PlaneStatsAverage", float)
+
+        if d_start_thresh <= avg <= d_end_thresh:
+            dark.append(n)
+
+        elif l_start_thresh <= avg <= l_end_thresh:
+            light.append(n)
+
+        return clip
+
+    s_clip = clip.std.PlaneStats()
+
+    eval_frames = core.std.FrameEval(clip, partial(checkclip, clip=s_clip), prop_src=s_clip)
+    clip_async_render(eval_frames, progress="Rendering...")
+
+    dark.sort()
+    light.sort()
+
+    dark_dedupe = [dark[0]]
+    light_dedupe = [light[0]]
+
+    thr = round(clip.fps_num / clip.fps_den * diff_thr)
+    lastvald = dark[0]
+    lastvall = light[0]
+
+    for i in range(1, len(dark)):
+        checklist = dark[0:i]
+        x = dark[i]
+
+        for y in checklist:
+            if x >= y + thr and x >= lastvald + thr:
+                dark_dedupe.append(x)
+                lastvald = x
+                break
+
+    for i in range(1, len(light)):
+        checklist = light[0:i]
+        x = light[i]
+
+        for y in checklist:
+            if x >= y + thr and x >= lastvall + thr:
+                light_dedupe.append(x)
+                lastvall = x
+                break
+
+    if len(dark_dedupe) > dark_frames:
+        random.seed(seed)
+        dark_dedupe = random.sample(dark_dedupe, dark_frames)
+
+    if len(light_dedupe) > light_frames:
+        random.seed(seed)
+        light_dedupe = random.sample(light_dedupe, light_frames)
+
+    return dark_dedupe + light_dedupe
+
+
+def main() -> None:
+    clip = synthetic_clip()
+
+    start = perf_counter()
+    legacy = legacy_lazylist(clip, seed=SEED)
+    legacy_time = perf_counter() - start
+
+    start = perf_counter()
+    current = sgtfunc.lazylist(clip, seed=SEED)
+    current_time = perf_counter() - start
+
+    print(f"frames:  {clip.num_frames}")
+    print(f"legacy:  {legacy_time:.2f}s")
+    print(f"current: {current_time:.2f}s ({legacy_time / current_time:.2f}x)")
+
+    assert legacy == current, f"{legacy} != {current}"
+
+
+if __name__ == "__main__":
+    main()
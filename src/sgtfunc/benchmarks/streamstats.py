@@ -0,0 +1,49 @@
+# Compares `RunningStats` against the `statistics` module on random data with
+# the spread of per-frame rescale errors, in both the constant memory and the
+# exact mode, and checks that the results agree.
+#
+#   python src/sgtfunc/benchmarks/streamstats.py
+
+import random
+import statistics
+from time import perf_counter
+
+from sgtfunc.streamstats import RunningStats
+
+NUM_VALUES = 200_000
+SEED = 20202020
+
+
+def main() -> None:
+    rng = random.Random(SEED)
+    values = [rng.lognormvariate(-9.0, 0.6) for _ in range(NUM_VALUES)]
+
+    start = perf_counter()
+    expected = (statistics.fmean(values), statistics.median(values), statistics.stdev(values))
+    reference = perf_counter() - start
+
+    for exact in (False, True):
+        start = perf_counter()
+        stats = RunningStats(values, exact=exact)
+        result = (stats.mean, stats.median, stats.stdev)
+        elapsed = perf_counter() - start
+
+        print(f"exact={exact!s:<5} {elapsed:.2f}s  mean {result[0]:.6g}  median {result[1]:.6g}  stdev {result[2]:.6g}")
+
+        # The approximate median is within a percent on a sample this size.
+        assert result[0] == expected[0] if exact else abs(result[0] - expected[0]) <= 1e-12 * expected[0]
+        assert abs(result[1] - expected[1]) <= (0 if exact else 0.01 * expected[1])
+        assert abs(result[2] - expected[2]) <= 1e-9 * expected[2]
+        assert stats.min == min(values)
+        assert stats.max == max(values)
+
+    print(f"statistics  {reference:.2f}s  mean {expected[0]:.6g}  median {expected[1]:.6g}  stdev {expected[2]:.6g}")
+
+    # A handful of values are exact in both modes.
+    for n in range(1, 6):
+        sample = values[:n]
+        assert RunningStats(sample).median == statistics.median(sample)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,31 @@
 __version__ = "0.0.0+local"
 
+from .align import AlignmentPlan, AlignmentSegment, align, luma_fingerprints
+from .autotune import CoreSettings, autotune, tune_core
+from .checkpoint import checkpoint
+from .creditless import CreditlessIndex, CreditlessMatch
+from .encode import EncodeChunk, encode_chunked, frame_hashes, scene_chunks
+from .framestats import FrameStatsStore
+from .framestore import RawFrameStore
+from .profiling import StageProfile, StageProfiler, StageSpan, StageStats
+from .render import iter_frames, render_frames
+from .rescale import SceneRaceResult, SceneRescaleErrors, SceneRescaleReport, SceneRescaleStats
+from .scenesource import LazyClip, SceneSourceSelector, choose_by_packet_size, resolve_clip
 from .sgtfunc import (
+    DenoiseBackend,
+    DenoiseTimings,
     SceneBasedAdbHeuristics,
+    ScreengenStats,
     adb_heuristics,
     denoise,
+    denoise_backend,
+    denoise_timings,
     descale_errors_async,
     get_rescale_error,
     lazylist,
     pretty_kernel_name,
     sample_ptype,
     screengen,
+    screengen_multi,
 )
+from .streamstats import RunningStats, gather_stats
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import itertools
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from .render import render_frames
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    from vstools import vs
+
+_UNMATCHED_COST = 4.0
+"""Cost of a frame without a counterpart, twice that of two unrelated frames."""
+
+
+def luma_fingerprints(
+    clip: vs.VideoNode,
+    frames: Iterable[int] | None = None,
+    *,
+    width: int = 16,
+    height: int = 9,
+    requests: int | None = None,
+    progress: str | None = "Fingerprinting...",
+) -> npt.NDArray[np.float32]:
+    """
+    Downscales the luma of every frame (defaults to all of them) to a tiny
+    thumbnail and returns them as an array of shape `(n, height * width)`.
+
+    These are cheap to compare and robust to encoding differences between
+    sources, which makes them suitable for aligning or matching clips.
+    """
+
+    import numpy as np
+    from vstools import core, vs
+
+    thumbnails = core.resize.Bilinear(clip, width, height, format=vs.GRAYS)
+    frames = range(clip.num_frames) if frames is None else frames
+
+    rows = render_frames(
+        thumbnails, frames, lambda _, f: np.asarray(f[0]).ravel().copy(), requests=requests, progress=progress
+    )
+    return np.stack(rows) if rows else np.zeros((0, width * height), np.float32)
+
+
+@dataclass
+class AlignmentSegment:
+    start: int
+    """First frame of the segment in the reference."""
+
+    stop: int
+    """Frame after the last one of the segment in the reference."""
+
+    offset: int
+    """Reference frame `n` matches frame `n + offset` of the other clip."""
+
+
+@dataclass
+class AlignmentPlan:
+    num_frames: int
+    """Length of the reference."""
+
+    segments: list[AlignmentSegment] = field(default_factory=list)
+    """Consecutive runs of frames sharing the same offset, covering the reference."""
+
+    def apply(self, other: vs.VideoNode) -> vs.VideoNode:
+        """
+        Splices `other` so that it lines up with the reference frame for frame.
+        Frames without a counterpart in `other` are blank.
+        """
+
+        from vstools import core
+
+        clips: list[vs.VideoNode] = []
+        for segment in self.segments:
+            start, stop = segment.start + segment.offset, segment.stop + segment.offset
+
+            if start < 0:
+                clips.append(other.std.BlankClip(length=min(-start, stop - start), keep=True))
+            if (first := max(start, 0)) < (last := min(stop, other.num_frames)):
+                clips.append(other[first:last])
+            if stop > max(other.num_frames, start):
+                clips.append(other.std.BlankClip(length=stop - max(other.num_frames, start), keep=True))
+
+        return core.std.Splice(clips)
+
+    def __str__(self) -> str:
+        return "\n".join(
+            f"{segment.start:>6}-{segment.stop - 1:<6} offset {segment.offset:+d}" for segment in self.segments
+        )
+
+
+def align(
+    reference: vs.VideoNode | npt.NDArray[np.floating],
+    other: vs.VideoNode | npt.NDArray[np.floating],
+    *,
+    max_offset: int | None = None,
+    max_drift: int = 48,
+    switch_cost: float = 16.0,
+    requests: int | None = None,
+) -> AlignmentPlan:
+    """
+    Finds how `other` lines up with `reference`: the overall offset between
+    them, plus any dropped or duplicated frames along the way.
+
+    Both clips are reduced to `luma_fingerprints()` in one streaming pass each.
+    The overall offset is the one with the smallest mean squared difference
+    between the fingerprints, which is computed for every offset at once with
+    an FFT cross-correlation. Every reference frame is then matched against
+    every offset within `max_drift` of it, and the offset of each frame is
+    picked by a shortest path through those differences that pays
+    `switch_cost` for every change of the offset. This places every dropped or
+    duplicated frame on the exact frame, however close together they are,
+    except within static shots, where every offset matches equally well.
+
+    Example usage::
+
+      plan = align(amzn, adn)
+      print(plan)
+      adn = plan.apply(adn)
+
+    :param reference: Clip to align to, or its fingerprints.
+    :param other: Clip to align, or its fingerprints.
+    :param max_offset: Largest overall offset to consider. Defaults to any
+        offset for which the clips overlap by at least half of the shorter one.
+    :param max_drift: Largest difference of the offset from the overall one
+        anywhere in the clip.
+    :param switch_cost: Cost of changing the offset, as a multiple of the
+        typical difference between matching frames of the two clips. Higher
+        values ignore changes that only show on a few frames.
+    :param requests: Maximum number of frames in flight while fingerprinting.
+
+    :return: Plan that maps every reference frame to a frame of `other`.
+    """
+
+    import numpy as np
+
+    a = _normalize(reference if isinstance(reference, np.ndarray) else luma_fingerprints(reference, requests=requests))
+    b = _normalize(other if isinstance(other, np.ndarray) else luma_fingerprints(other, requests=requests))
+
+    lags, msd, overlap = _msd_by_lag(a, b)
+    valid = overlap >= min(len(a), len(b)) // 2
+    if max_offset is not None:
+        valid &= np.abs(lags) <= max_offset
+    if not valid.any():
+        raise ValueError("The clips don't overlap enough to be aligned.")
+    offset = int(lags[np.flatnonzero(valid)[np.argmin(msd[valid])]])
+
+    offsets = np.arange(offset - max_drift, offset + max_drift + 1)
+    costs = _costs_by_offset(a, b, offsets)
+    # The differences between matching frames are the noise that a change of
+    # the offset has to stand out from.
+    noise = float(np.median(costs.min(axis=1)))
+    path = offsets[_cheapest_path(costs, switch_cost * noise + 1e-9)]
+
+    plan = AlignmentPlan(len(a))
+    changes = np.flatnonzero(np.diff(path)) + 1
+    for start, stop in itertools.pairwise([0, *changes.tolist(), len(a)]):
+        plan.segments.append(AlignmentSegment(start, stop, int(path[start])))
+
+    return plan
+
+
+def _normalize(fingerprints: npt.NDArray[np.floating]) -> npt.NDArray[np.float64]:
+    import numpy as np
+
+    # Remove level and contrast differences between sources.
+    x = fingerprints.astype(np.float64)
+    x -= x.mean()
+    return x / (x.std() or 1.0)
+
+
+def _msd_by_lag(
+    a: npt.NDArray[np.float64], b: npt.NDArray[np.float64]
+) -> tuple[npt.NDArray[np.intp], npt.NDArray[np.float64], npt.NDArray[np.intp]]:
+    """
+    Mean squared difference between `a[i]` and `b[i + lag]` over their overlap
+    for every lag, along with the lags and the overlaps' lengths.
+    """
+
+    import numpy as np
+
+    na, nb = len(a), len(b)
+    n = 1 << (na + nb - 1).bit_length()
+
+    # Cross-correlation summed over the fingerprint's dimensions. Negative lags
+    # wrap around to the end.
+    # Transposed so that every transform runs over contiguous memory.
+    spectrum = (np.conj(np.fft.rfft(a.T.copy(), n)) * np.fft.rfft(b.T.copy(), n)).sum(axis=0)
+    xcorr = np.fft.irfft(spectrum, n)
+
+    lags = np.arange(-(na - 1), nb)
+    xcorr = xcorr[lags % n]
+
+    # Energies of the overlapping frames from cumulative sums.
+    ea = np.concatenate([[0.0], np.cumsum((a * a).sum(axis=1))])
+    eb = np.concatenate([[0.0], np.cumsum((b * b).sum(axis=1))])
+    first = np.maximum(0, -lags)
+    last = np.minimum(na, nb - lags)
+    overlap = last - first
+
+    msd = (ea[last] - ea[first] + eb[last + lags] - eb[first + lags] - 2 * xcorr) / (overlap * a.shape[1])
+    return lags, msd, overlap
+
+
+def _costs_by_offset(
+    a: npt.NDArray[np.float64], b: npt.NDArray[np.float64], offsets: npt.NDArray[np.intp]
+) -> npt.NDArray[np.float64]:
+    """
+    Mean squared difference between `a[n]` and `b[n + offset]` for every frame
+    of `a` and every offset, as an array of shape `(len(a), len(offsets))`.
+    Frames without a counterpart in `b` cost the same at every offset.
+    """
+
+    import numpy as np
+
+    costs = np.full((len(a), len(offsets)), _UNMATCHED_COST)
+    for k, offset in enumerate(offsets.tolist()):
+        lo, hi = max(-offset, 0), min(len(a), len(b) - offset)
+        if lo < hi:
+            costs[lo:hi, k] = ((a[lo:hi] - b[lo + offset : hi + offset]) ** 2).mean(axis=1)
+
+    return costs
+
+
+def _cheapest_path(costs: npt.NDArray[np.float64], switch_cost: float) -> npt.NDArray[np.intp]:
+    """
+    Column for every row of `costs` that minimizes the total cost, plus
+    `switch_cost` for every change of the column. Ties keep the current column.
+    """
+
+    import numpy as np
+
+    n = len(costs)
+    switched = np.zeros(costs.shape, np.bool_)
+    came_from = np.zeros(n, np.intp)
+
+    total = costs[0].copy()
+    for i in range(1, n):
+        came_from[i] = best = int(np.argmin(total))
+        switched[i] = total[best] + switch_cost < total
+        total = np.where(switched[i], total[best] + switch_cost, total) + costs[i]
+
+    path = np.empty(n, np.intp)
+    path[-1] = int(np.argmin(total))
+    for i in range(n - 1, 0, -1):
+        path[i - 1] = came_from[i] if switched[i, path[i]] else path[i]
+
+    return path
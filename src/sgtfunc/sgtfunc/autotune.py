@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import time
+from collections.abc import Sequence
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from . import storage
+
+if TYPE_CHECKING:
+    from vstools import vs
+
+
+class CoreSettings(NamedTuple):
+    threads: int
+    """Number of threads of the core."""
+
+    max_cache: int
+    """Maximum size of the frame cache in MB."""
+
+
+def tune_core(
+    threads: int | None = None,
+    max_cache: int | None = None,
+    *,
+    key: str | None = None,
+    cache_dir: str | os.PathLike[str] | None = None,
+) -> CoreSettings:
+    """
+    Sets up the core with this host's settings from `autotune()`, in place of
+    hard-coding `core.set_affinity()` for one machine. Call it at the start of
+    a script.
+
+    Without tuned settings for the host, `threads` and `max_cache` are used
+    instead, capped to the host's thread count and half of its memory so that
+    values picked for a bigger machine don't oversubscribe a smaller one.
+
+    Example usage::
+
+      sgtfunc.tune_core(22, 2 << 13)
+
+    :param threads: Threads to use without tuned settings. Defaults to all.
+    :param max_cache: Cache size in MB to use without tuned settings. Defaults
+        to the core's default.
+    :param key: Name of the tuned settings. Defaults to the running script's
+        folder, so that the episodes of a show share them.
+    :param cache_dir: Directory to store profiles in. Defaults to
+        `.vsjet/sgtfunc/autotune` next to the running script.
+
+    :return: The settings that were applied.
+    """
+
+    from vstools import core
+
+    tuned = _read_profile(_profile_path(cache_dir)).get(key or _default_key())
+    if tuned is not None:
+        settings = CoreSettings(tuned["threads"], tuned["max_cache"])
+    else:
+        cpus, memory = _host_resources()
+        settings = CoreSettings(
+            min(threads or cpus, cpus),
+            min(max_cache, memory // 2) if max_cache is not None else int(core.max_cache_size),
+        )
+
+    core.set_affinity(settings.threads, settings.max_cache)
+
+    return settings
+
+
+def autotune(
+    clip: vs.VideoNode,
+    sample: int = 48,
+    *,
+    key: str | None = None,
+    threads: Sequence[int] | None = None,
+    max_caches: Sequence[int] | None = None,
+    force: bool = False,
+    cache_dir: str | os.PathLike[str] | None = None,
+) -> CoreSettings:
+    """
+    Finds the thread count and cache size that render a clip the fastest on
+    this host, stores them in the host's profile for `tune_core()` and applies
+    them.
+
+    Every combination is timed on frames that no other combination rendered,
+    so that none of them is served from another's caches: two runs of
+    consecutive frames, one from each half of the clip, spread out so that
+    the content evens out. Another run is rendered beforehand so that opening
+    sources and initializing plugins aren't attributed to the first
+    combination. If the host already has settings under `key`, they are
+    applied without tuning again unless `force` is set.
+
+    Example usage::
+
+      if not is_preview():
+          sgtfunc.autotune(final)
+          ...
+
+    :param clip: Clip to tune for, usually the final output.
+    :param sample: Number of frames to time every combination on.
+    :param key: Name of the tuned settings. Defaults to the running script's
+        folder, so that the episodes of a show share them.
+    :param threads: Thread counts to try. Defaults to a quarter, half, three
+        quarters and all of the host's threads.
+    :param max_caches: Cache sizes in MB to try. Defaults to an eighth, a
+        quarter and half of the host's memory.
+    :param force: Tune even if the host already has settings under `key`.
+    :param cache_dir: Directory to store profiles in. Defaults to
+        `.vsjet/sgtfunc/autotune` next to the running script.
+
+    :return: The best settings, which have been applied.
+    """
+
+    from vstools import core
+
+    from .render import render_frames
+
+    key = key or _default_key()
+    path = _profile_path(cache_dir)
+    profile = _read_profile(path)
+
+    if not force and key in profile:
+        return tune_core(key=key, cache_dir=cache_dir)
+
+    cpus, memory = _host_resources()
+    threads = threads or sorted({max(cpus * i // 4, 1) for i in range(1, 5)})
+    max_caches = max_caches or [memory // 8, memory // 4, memory // 2]
+    grid = [CoreSettings(num_threads, max_cache) for num_threads in threads for max_cache in max_caches]
+
+    # Run `i` goes to the warm-up and runs `i` and `i + len(grid)` to
+    # combination `i - 1`, with a gap after every run so that temporal filters
+    # don't reach into the next one.
+    run_length = sample // 2
+    spacing = clip.num_frames // (2 * len(grid) + 1)
+    if run_length < 1 or spacing < 2 * run_length:
+        raise ValueError(f"The clip is too short to time {len(grid)} combinations on {sample} frames each.")
+    runs = [range(i * spacing, i * spacing + run_length) for i in range(2 * len(grid) + 1)]
+
+    core.set_affinity(max(threads), max(max_caches))
+    render_frames(clip, runs[0], lambda *_: None, progress="Warming up...")
+
+    results: dict[CoreSettings, float] = {}
+    for i, settings in enumerate(grid, 1):
+        frames = [*runs[i], *runs[i + len(grid)]]
+        core.set_affinity(settings.threads, settings.max_cache)
+
+        start_time = time.perf_counter()
+        render_frames(
+            clip, frames, lambda *_: None, progress=f"Timing {settings.threads} threads, {settings.max_cache} MB..."
+        )
+        results[settings] = len(frames) / (time.perf_counter() - start_time)
+
+    best = max(results, key=results.__getitem__)
+
+    print(f"{key} on {socket.gethostname()}, {2 * run_length} frames each:")
+    for settings, fps in sorted(results.items(), key=lambda x: x[1], reverse=True):
+        print(f"  {settings.threads:>3} threads{settings.max_cache:>8} MB{fps:10.2f} fps")
+
+    profile[key] = {"threads": best.threads, "max_cache": best.max_cache, "fps": results[best]}
+    storage.write_atomic(path, json.dumps({"cpus": cpus, "memory": memory, "scripts": profile}, indent=2))
+
+    core.set_affinity(best.threads, best.max_cache)
+
+    return best
+
+
+def _profile_path(cache_dir: str | os.PathLike[str] | None) -> Path:
+    directory = Path(cache_dir) if cache_dir is not None else storage.cache_dir("autotune")
+    return directory / f"{socket.gethostname()}.json"
+
+
+def _read_profile(path: Path) -> dict[str, dict[str, Any]]:
+    """
+    Tuned settings by key from a host's profile. Profiles made before the
+    host's thread count or memory changed are ignored.
+    """
+
+    try:
+        profile = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+    if [profile.get("cpus"), profile.get("memory")] != list(_host_resources()):
+        return {}
+
+    return dict(profile.get("scripts", {}))
+
+
+def _host_resources() -> tuple[int, int]:
+    """
+    Number of threads and memory in MB of this host.
+    """
+
+    from psutil import virtual_memory
+
+    return os.cpu_count() or 1, virtual_memory().total // (1 << 20)
+
+
+def _default_key() -> str:
+    from vstools import get_script_path
+
+    # vspreview registers a hook for the script it has loaded, since it runs
+    # as `__main__` itself. Without a script, this is the working directory.
+    script = Path(get_script_path()).resolve()
+    return script.parent.name if script.is_file() else script.name
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+from collections.abc import Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+from . import storage
+
+if TYPE_CHECKING:
+    from vstools import vs
+
+STATIC_PROPS = (
+    "_ChromaLocation",
+    "_ColorRange",
+    "_FieldBased",
+    "_Matrix",
+    "_Primaries",
+    "_SARDen",
+    "_SARNum",
+    "_Transfer",
+)
+"""Frame props that are carried over to a checkpoint, taken from its first frame."""
+
+
+def checkpoint(
+    clip: vs.VideoNode,
+    key: str,
+    source_files: Iterable[str | os.PathLike[str]] = (),
+    *,
+    backend: Literal["ffv1", "raw"] = "ffv1",
+    render: bool = True,
+    cache_dir: str | os.PathLike[str] | None = None,
+) -> vs.VideoNode:
+    """
+    Materializes an intermediate clip to a lossless file and reads it back on
+    later runs, so that tweaking stages after it doesn't re-run the expensive
+    ones before it.
+
+    Two backends are available:
+
+    - `"ffv1"`: an FFV1 file read back through BestSource. Compact, but integer
+      YUV and GRAY formats only and it has to be rendered in one go.
+    - `"raw"`: a `RawFrameStore`. Much larger, but faster to read back,
+      supports float formats and resumes interrupted renders.
+
+    Checkpoints are keyed by the source files' paths, sizes and modification
+    times, the clip's format and length and `key`. Since a filter graph can't
+    be introspected, `key` has to describe every parameter upstream of `clip`
+    that should invalidate the checkpoint.
+
+    Only the props in `STATIC_PROPS` survive a checkpoint, taken from the first
+    frame. Anything that varies per frame, such as scene props, is lost, so
+    checkpoint after the stages that need them.
+
+    Example usage::
+
+      denoised = sgtfunc.denoise(src, sigma=0.65)
+      denoised = sgtfunc.checkpoint(denoised, "denoise sigma=0.65", [FILE], render=not is_preview())
+
+    :param clip: Clip to checkpoint.
+    :param key: Description of the parameters that produced `clip`.
+    :param source_files: Files that `clip` was indexed from.
+    :param backend: How to store the checkpoint.
+    :param render: Render the checkpoint if it doesn't exist yet. Otherwise,
+        `clip` is returned as is, e.g. in previews.
+    :param cache_dir: Directory to store checkpoints in. Defaults to
+        `.vsjet/sgtfunc/checkpoints` next to the running script.
+
+    :return: Clip read back from the checkpoint, or `clip` if there isn't one
+        and `render` is false.
+    """
+
+    from vstools import core, vs
+
+    from .framestore import RawFrameStore
+
+    # Checked before anything is written, as the clip is only piped to ffmpeg
+    # as Y4M once it's running.
+    if backend == "ffv1" and (
+        clip.format.sample_type != vs.INTEGER or clip.format.color_family not in (vs.YUV, vs.GRAY)
+    ):
+        raise ValueError("FFV1 checkpoints only support integer YUV and GRAY formats; use the raw backend instead.")
+
+    directory = Path(cache_dir) if cache_dir is not None else storage.cache_dir("checkpoints")
+    digest = storage.fingerprint(None, *(storage.fingerprint(f) for f in source_files), *storage.clip_info(clip), key)
+    meta_path = directory / f"{digest}.json"
+
+    if backend == "raw":
+        store_path = directory / f"{digest}.raw"
+
+        # Opening the store creates it at full size, so don't when it would
+        # only be thrown away.
+        if not render and not (store_path.exists() and meta_path.exists()):
+            return clip
+
+        store = RawFrameStore(store_path, clip)
+        if store.missing().size:
+            if not render:
+                store.close()
+                return clip
+
+            store.fill(progress=f"Checkpointing to {store.path.name}...")
+
+        # Without the metadata the checkpoint is incomplete, even if every
+        # frame is there.
+        if not meta_path.exists():
+            storage.write_atomic(meta_path, json.dumps({"key": key, "props": _static_props(clip)}, indent=2))
+
+        # The store has to stay open for as long as the clip is used.
+        cached = store.clip()
+    else:
+        video_path = directory / f"{digest}.mkv"
+
+        # The metadata is written last, so a checkpoint without it is incomplete.
+        if not (video_path.exists() and meta_path.exists()):
+            if not render:
+                return clip
+
+            _write_ffv1(clip, video_path)
+            storage.write_atomic(meta_path, json.dumps({"key": key, "props": _static_props(clip)}, indent=2))
+
+        cached = core.bs.VideoSource(str(video_path))
+        if (cached.format.id, cached.width, cached.height, cached.num_frames) != (
+            clip.format.id,
+            clip.width,
+            clip.height,
+            clip.num_frames,
+        ):
+            raise ValueError(f'Checkpoint "{video_path}" doesn\'t match the clip; delete it to render it again.')
+
+        cached = cached.std.AssumeFPS(fpsnum=clip.fps.numerator, fpsden=clip.fps.denominator)
+
+    props = json.loads(meta_path.read_text(encoding="utf-8"))["props"]
+
+    return cached.std.SetFrameProps(**props)
+
+
+def _static_props(clip: vs.VideoNode) -> dict[str, int]:
+    from vstools import get_prop
+
+    with clip.get_frame(0) as f:
+        return {prop: get_prop(f, prop, int) for prop in STATIC_PROPS if prop in f.props}
+
+
+def _write_ffv1(clip: vs.VideoNode, path: Path) -> None:
+    from muxtools import get_executable
+    from vstools import get_render_progress
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f"{path.stem}.tmp.mkv")
+
+    # Same settings as vsmuxtools' FFV1 encoder with the middleground preset.
+    args = [
+        get_executable("ffmpeg"),
+        *("-hide_banner", "-loglevel", "error", "-y"),
+        *("-f", "yuv4mpegpipe", "-i", "-"),
+        *("-c:v", "ffv1", "-coder", "1", "-context", "0", "-g", "1", "-level", "3", "-threads", "0"),
+        *("-slices", "24", "-slicecrc", "1"),
+        str(temp_path),
+    ]
+
+    with (
+        subprocess.Popen(args, stdin=subprocess.PIPE) as process,  # noqa: S603
+        get_render_progress(f"Checkpointing to {path.name}...", clip.num_frames) as p,
+    ):
+        assert process.stdin is not None
+        clip.output(process.stdin, y4m=True, progress_update=lambda current, total: p.update(current, total))
+        process.stdin.close()
+
+        if process.wait():
+            temp_path.unlink(missing_ok=True)
+            raise RuntimeError(f"ffmpeg exited with code {process.returncode} while writing {path}.")
+
+    temp_path.replace(path)
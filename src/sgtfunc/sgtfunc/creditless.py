@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Mapping
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from . import storage
+from .align import _msd_by_lag, luma_fingerprints
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    from vstools import vs
+
+
+class CreditlessMatch(NamedTuple):
+    name: str
+    """Name of the creditless clip."""
+
+    start: int
+    """First frame of the match in the episode."""
+
+    end: int
+    """Last frame of the match in the episode, inclusive like `OP = (576, 2733)`."""
+
+    error: float
+    """Mean squared difference between the fingerprints over the match."""
+
+
+class CreditlessIndex:
+    """
+    Fingerprints of creditless OPs and EDs, for finding where they are in
+    episodes instead of scrubbing for the ranges by hand.
+
+    The fingerprints are cached on disk per NC file, so the index is built
+    once and every episode of a season then only has to scan itself.
+
+    Example usage::
+
+      index = CreditlessIndex({"OP": ncop, "ED": nced}, {"OP": NCOP_FILE, "ED": NCED_FILE})
+      ranges = index.locate(src)
+      OP = ranges["OP"].start, ranges["OP"].end
+    """
+
+    def __init__(
+        self,
+        clips: Mapping[str, vs.VideoNode],
+        source_files: Mapping[str, str | os.PathLike[str]],
+        key: str = "",
+        *,
+        width: int = 16,
+        height: int = 9,
+        cache_dir: str | os.PathLike[str] | None = None,
+    ) -> None:
+        """
+        :param clips: Creditless clips by name, e.g. `"OP"` and `"ED"`.
+        :param source_files: Files the clips were indexed from, by name.
+        :param key: Free-form description of any filtering applied to the
+            clips, e.g. trims.
+        :param width: Width of the fingerprints.
+        :param height: Height of the fingerprints.
+        :param cache_dir: Directory to store fingerprints in. Defaults to
+            `.vsjet/sgtfunc/creditless` next to the running script.
+        """
+
+        import numpy as np
+
+        self.width = width
+        self.height = height
+
+        directory = Path(cache_dir) if cache_dir is not None else storage.cache_dir("creditless")
+
+        self.fingerprints: dict[str, npt.NDArray[np.float32]] = {}
+        """Fingerprints of every frame of the creditless clips, by name."""
+
+        for name, clip in clips.items():
+            path = directory / (
+                f"{storage.fingerprint(source_files[name], *storage.clip_info(clip), key, width, height)}.npy"
+            )
+
+            if path.exists():
+                self.fingerprints[name] = np.load(path)
+                continue
+
+            fingerprints = luma_fingerprints(
+                clip, width=width, height=height, progress=f"Fingerprinting {name} ({clip.num_frames} frames)..."
+            )
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_suffix(".tmp.npy")
+            np.save(temp_path, fingerprints)
+            temp_path.replace(path)
+
+            self.fingerprints[name] = fingerprints
+
+    def locate(
+        self,
+        clip: vs.VideoNode,
+        *,
+        step: int = 8,
+        max_error: float = 0.01,
+        requests: int | None = None,
+    ) -> dict[str, CreditlessMatch]:
+        """
+        Finds the creditless clips in an episode.
+
+        The episode is fingerprinted in a single pass over every `step`th frame
+        only. Each creditless clip is then matched at every phase of that step
+        with an FFT cross-correlation, which still places it on the exact
+        frame.
+
+        :param clip: Episode to search.
+        :param step: Distance between fingerprinted frames of the episode.
+        :param max_error: Largest mean squared difference between the
+            fingerprints, on a 0-1 scale, for a match to count. Credits
+            on top of the OP or ED raise it somewhat.
+        :param requests: Maximum number of frames in flight while fingerprinting.
+
+        :return: Matches by name. Creditless clips that aren't fully in the
+            episode are left out.
+        """
+
+        import numpy as np
+
+        scan = luma_fingerprints(
+            clip,
+            range(0, clip.num_frames, step),
+            width=self.width,
+            height=self.height,
+            requests=requests,
+            progress=f"Scanning for {', '.join(self.fingerprints)}...",
+        ).astype(np.float64)
+
+        matches: dict[str, CreditlessMatch] = {}
+        for name, fingerprints in self.fingerprints.items():
+            best: CreditlessMatch | None = None
+
+            for phase in range(min(step, len(fingerprints))):
+                # Frame `phase + i * step` of the creditless clip against
+                # frame `(i + lag) * step` of the episode.
+                decimated = fingerprints[phase::step].astype(np.float64)
+                lags, msd, overlap = _msd_by_lag(decimated, scan)
+
+                full = np.flatnonzero(overlap == len(decimated))
+                if not full.size:
+                    continue
+
+                i = full[np.argmin(msd[full])]
+                start = int(lags[i]) * step - phase
+                if (
+                    start >= 0
+                    and start + len(fingerprints) <= clip.num_frames
+                    and (best is None or msd[i] < best.error)
+                ):
+                    best = CreditlessMatch(name, start, start + len(fingerprints) - 1, float(msd[i]))
+
+            if best is not None and best.error <= max_error:
+                matches[name] = best
+
+        return matches
@@ -0,0 +1,588 @@
+from __future__ import annotations
+
+import bisect
+import itertools
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import threading
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b, sha256
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, NamedTuple
+
+from . import storage
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    from muxtools import VideoFile
+    from vsmuxtools import x265
+    from vsmuxtools.video.encoders.types import Zone
+    from vstools import Keyframes, vs
+
+
+class EncodeChunk(NamedTuple):
+    position: int
+    """Position of the chunk in the output."""
+
+    start: int
+    """First frame of the chunk."""
+
+    stop: int
+    """Frame after the last one of the chunk."""
+
+    @property
+    def num_frames(self) -> int:
+        return self.stop - self.start
+
+
+def scene_chunks(keyframes: Keyframes | list[int], num_frames: int, count: int) -> list[EncodeChunk]:
+    """
+    Splits a clip into about `count` chunks of similar length, cutting only at
+    scene changes.
+    """
+
+    cuts = sorted(k for k in set(keyframes) if 0 < k < num_frames)
+
+    # Cut at the scene change closest to each even split.
+    bounds = [0]
+    for i in range(1, count):
+        ideal = i * num_frames // count
+        pos = bisect.bisect_left(cuts, ideal)
+        nearest = min(cuts[max(pos - 1, 0) : pos + 1], key=lambda k: abs(k - ideal), default=None)
+        if nearest is not None and nearest > bounds[-1]:
+            bounds.append(nearest)
+    bounds.append(num_frames)
+
+    return [EncodeChunk(i, start, stop) for i, (start, stop) in enumerate(itertools.pairwise(bounds))]
+
+
+def encode_chunked(
+    encoder: x265,
+    clip: vs.VideoNode,
+    keyframes: Keyframes | list[int],
+    outfile: str | os.PathLike[str],
+    *,
+    workers: int = 1,
+    chunks: int | None = None,
+    resume: bool = True,
+    incremental: bool = False,
+    key: str = "",
+) -> VideoFile:
+    """
+    Encodes a clip with several x265 processes in parallel, each fed its own
+    range of frames, and joins their output into a single HEVC stream.
+
+    The clip is cut into chunks at scene changes, so every chunk starts on the
+    keyframe that a single encode would have placed there anyway. Zones are
+    split along with the chunks and scene changes are forced as I-frames with a
+    qpfile per chunk, in place of `qp_clip`. Every x265 stream starts with its
+    own parameter sets and an IDR frame, so the chunks are joined by
+    concatenating them as is.
+
+    Finished chunks are recorded in a manifest next to the output along with
+    the chunk layout and fingerprints of the settings, the clip and the running
+    script. If the encode is interrupted, running it again with the same
+    fingerprints only encodes the chunks that are missing. Anything else
+    starts over.
+
+    The frames are hashed as they are fed to x265, and the hashes are kept next
+    to the output along with every chunk's size. With `incremental`, an
+    existing output is updated instead of encoded again: the clip is hashed in
+    a streaming pass, and only the chunks that contain frames that changed
+    since are encoded and spliced into the stream in place of the old ones.
+    This requires the same settings, zones, length and keyframes as the last
+    encode, and falls back to a full encode otherwise.
+
+    The output is not identical to that of a single x265 run over the whole
+    clip: rate control and lookahead start over at every chunk, and each one
+    begins with its own IDR frame. More chunks make resuming and updating cheaper at the expense of
+    more such boundaries, so their number is left to the caller.
+
+    x265 uses every core by default, so limit each process with `--pools` in
+    the settings when running several of them.
+
+    Example usage::
+
+      encoder = x265(settings, zones=zones)
+      video = encode_chunked(encoder, final, keyframes, "encoded.265", workers=4)
+
+    :param encoder: Encoder to take the executable, settings and zones from.
+        Its `qp_clip`, `qp_file`, `csv` and `resumable` are ignored.
+    :param clip: Clip to encode. Clips over 12 bit are dithered to 10 bit like
+        `x265.encode()` does.
+    :param keyframes: Scene changes of the clip.
+    :param outfile: Elementary stream to write.
+    :param workers: Number of x265 processes to run at once.
+    :param chunks: Number of chunks to split the clip into. Defaults to twice
+        the number of workers, which balances the load better than one each,
+        and to a single chunk with one worker. Pass more to lose less on a
+        crash and to redo less with `incremental`.
+    :param resume: Keep the chunks of an interrupted encode.
+    :param incremental: Only encode the chunks that changed since the last
+        encode to `outfile`.
+    :param key: Free-form description of anything else that should restart
+        the encode when it changes.
+
+    :return: The encoded stream.
+    """
+
+    import numpy as np
+    from muxtools import VideoFile
+    from vsmuxtools.video.settings import norm_zones
+    from vstools import finalize_clip
+
+    out = Path(outfile)
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    # Same as `x265.encode()`, before anything is taken from the clip.
+    if clip.format.bits_per_sample > 12:
+        print(f"x265 does not support a bit depth over 12, {out.name} will be dithered to 10 bit.")
+        clip = finalize_clip(clip, 10)
+
+    settings = _x265_settings(encoder, clip)
+    zones = norm_zones(clip, encoder.zones)
+
+    manifest_path = out.with_name(f"{out.name}.manifest.json")
+    index_path = out.with_name(f"{out.name}.index.json")
+    hashes_path = out.with_name(f"{out.name}.framehashes.npy")
+    fingerprints = {
+        "settings": storage.fingerprint(None, encoder.executable, *settings, zones),
+        "clip": storage.fingerprint(None, *storage.clip_info(clip), sorted(set(keyframes))),
+        "script": _script_fingerprint(),
+        "key": key,
+    }
+
+    if incremental and out.exists():
+        # The script is expected to have changed, the rest has to match.
+        index = _read_index(index_path, out, {k: v for k, v in fingerprints.items() if k != "script"})
+        if index is not None and hashes_path.exists():
+            return _encode_changed(
+                encoder, settings, clip, keyframes, zones, out, fingerprints, *index, workers=workers
+            )
+        print(f"{out.name} has no matching index, encoding it again.")
+
+    layout: list[EncodeChunk] | None = None
+    done: dict[int, int] = {}
+    hashes = np.zeros((clip.num_frames, 16), np.uint8)
+    if resume and manifest_path.exists():
+        # Chunks without their frames' hashes can't be updated incrementally.
+        layout, done = _read_manifest(manifest_path, out, fingerprints, hashes)
+
+    if layout is None:
+        for stale in out.parent.glob(f"{out.stem}.part_*"):
+            stale.unlink()
+        layout = scene_chunks(keyframes, clip.num_frames, chunks or (2 * workers if workers > 1 else 1))
+
+    lock = threading.Lock()
+
+    def write_manifest() -> None:
+        _save_hashes(hashes_path, hashes)
+        _write_manifest(manifest_path, fingerprints, layout, done)
+
+    def finished(chunk: EncodeChunk, path: Path) -> None:
+        with lock:
+            done[chunk.position] = path.stat().st_size
+            write_manifest()
+
+    def record(n: int, f: vs.VideoFrame) -> vs.VideoFrame:
+        hashes[n] = np.frombuffer(_hash_frame(f), np.uint8)
+        return f
+
+    write_manifest()
+
+    pending = [chunk for chunk in layout if chunk.position not in done]
+    if len(pending) < len(layout):
+        print(f"Resuming {out.name}: {len(layout) - len(pending)} of {len(layout)} chunks already encoded.")
+
+    hashed = clip.std.ModifyFrame(clip, record)
+    _encode_chunks(encoder, settings, hashed, keyframes, zones, out, pending, workers=workers, finished=finished)
+
+    parts = [_part_path(out, chunk) for chunk in layout]
+    _join_chunks(parts, out)
+    _write_index(index_path, fingerprints, layout, [done[chunk.position] for chunk in layout])
+
+    for part in parts:
+        part.unlink()
+    manifest_path.unlink()
+
+    return VideoFile(out)
+
+
+def frame_hashes(
+    clip: vs.VideoNode,
+    frames: Iterable[int] | None = None,
+    *,
+    requests: int | None = None,
+    progress: str | None = "Hashing frames...",
+) -> npt.NDArray[np.uint8]:
+    """
+    128-bit hashes of the contents of the given frames (defaults to all of
+    them), as an array of shape `(n, 16)`. Frame props aren't hashed.
+    """
+
+    import numpy as np
+
+    from .render import render_frames
+
+    frames = range(clip.num_frames) if frames is None else frames
+    rows = render_frames(
+        clip, frames, lambda _, f: np.frombuffer(_hash_frame(f), np.uint8), requests=requests, progress=progress
+    )
+    return np.stack(rows) if rows else np.zeros((0, 16), np.uint8)
+
+
+def _encode_changed(
+    encoder: x265,
+    settings: list[str],
+    clip: vs.VideoNode,
+    keyframes: Keyframes | list[int],
+    zones: list[Zone],
+    out: Path,
+    fingerprints: dict[str, str],
+    layout: list[EncodeChunk],
+    sizes: list[int],
+    *,
+    workers: int,
+) -> VideoFile:
+    """
+    Encodes the chunks of `out` whose frames' hashes changed and splices them
+    into it.
+
+    Finished chunks are recorded in `<out>.update.json` until they are
+    spliced in, so an interrupted update only encodes the chunks that are
+    missing when it's run again with the same fingerprints.
+    """
+
+    import numpy as np
+    from muxtools import VideoFile
+
+    index_path = out.with_name(f"{out.name}.index.json")
+    hashes_path = out.with_name(f"{out.name}.framehashes.npy")
+    update_path = out.with_name(f"{out.name}.update.json")
+
+    hashes = frame_hashes(clip)
+    changed = np.flatnonzero((np.load(hashes_path) != hashes).any(axis=1))
+    starts = np.array([chunk.start for chunk in layout])
+    dirty = [layout[i] for i in np.unique(np.searchsorted(starts, changed, side="right") - 1)]
+
+    if not dirty:
+        print(f"{out.name} is up to date.")
+        return VideoFile(out)
+
+    done: dict[int, int] = {}
+    if update_path.exists():
+        update_layout, done = _read_manifest(update_path, out, fingerprints)
+        if update_layout != layout:
+            done = {}
+
+    lock = threading.Lock()
+
+    def finished(chunk: EncodeChunk, path: Path) -> None:
+        with lock:
+            done[chunk.position] = path.stat().st_size
+            _write_manifest(update_path, fingerprints, layout, done)
+
+    _write_manifest(update_path, fingerprints, layout, done)
+
+    pending = [chunk for chunk in dirty if chunk.position not in done]
+    print(
+        f"Encoding {len(pending)} of {len(layout)} chunks of {out.name} with {changed.size} changed frames"
+        + (f", {len(dirty) - len(pending)} already encoded." if len(pending) < len(dirty) else ".")
+    )
+    _encode_chunks(encoder, settings, clip, keyframes, zones, out, pending, workers=workers, finished=finished)
+
+    temp_path = out.with_name(f"{out.name}.tmp")
+    offsets = list(itertools.accumulate(sizes, initial=0))
+    with out.open("rb") as old, temp_path.open("wb") as f:
+        for chunk in layout:
+            part = _part_path(out, chunk)
+            if chunk in dirty:
+                with part.open("rb") as new:
+                    shutil.copyfileobj(new, f)
+                sizes[chunk.position] = part.stat().st_size
+            else:
+                old.seek(offsets[chunk.position])
+                _copy_bytes(old, f, sizes[chunk.position])
+
+    # The index is checked against the stream's size, so an interruption
+    # between these leaves a stale index that is ignored.
+    temp_path.replace(out)
+    _save_hashes(hashes_path, hashes)
+    _write_index(index_path, fingerprints, layout, sizes)
+
+    for chunk in dirty:
+        _part_path(out, chunk).unlink()
+    update_path.unlink()
+
+    return VideoFile(out)
+
+
+def _encode_chunks(
+    encoder: x265,
+    settings: list[str],
+    clip: vs.VideoNode,
+    keyframes: Keyframes | list[int],
+    zones: list[Zone],
+    out: Path,
+    chunks: list[EncodeChunk],
+    *,
+    workers: int,
+    finished: Callable[[EncodeChunk, Path], None],
+) -> None:
+    """
+    Encodes the given chunks of a clip in parallel to `<out>.part_<position>.265`
+    files next to `out`. A part only gets its final name once its encode has
+    finished, after which `finished` is called.
+    """
+
+    from vstools import get_render_progress
+
+    if not chunks:
+        return
+
+    lock = threading.Lock()
+    total = sum(chunk.num_frames for chunk in chunks)
+
+    with get_render_progress(f"Encoding {out.name} in {len(chunks)} chunks...", total) as p:
+
+        def encode(chunk: EncodeChunk) -> None:
+            done = 0
+
+            def update(current: int, _: int) -> None:
+                nonlocal done
+                with lock:
+                    p.update(advance=current - done)
+                done = current
+
+            finished(chunk, _encode_chunk(encoder, settings, clip, keyframes, zones, out, chunk, update))
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            # Consume the results to raise the first failure.
+            list(executor.map(encode, chunks))
+
+
+def _read_manifest(
+    path: Path, out: Path, fingerprints: dict[str, str], hashes: npt.NDArray[np.uint8] | None = None
+) -> tuple[list[EncodeChunk] | None, dict[int, int]]:
+    """
+    Chunk layout and finished chunks' sizes from an interrupted encode's
+    manifest, if it was made with the same fingerprints, and its frame hashes
+    into `hashes` if given. Finished chunks whose part is missing or has
+    another size are dropped.
+    """
+
+    import numpy as np
+
+    try:
+        if hashes is not None:
+            hashes[:] = np.load(out.with_name(f"{out.name}.framehashes.npy"))
+
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        if any(manifest.get(name) != value for name, value in fingerprints.items()):
+            print(f"{path.name} is from another encode, starting over.")
+            return None, {}
+
+        layout = [EncodeChunk(*chunk) for chunk in manifest["chunks"]]
+        recorded = {int(index): int(size) for index, size in manifest["done"].items()}
+    except (OSError, KeyError, TypeError, ValueError):
+        # Unreadable or from an older layout; start over.
+        return None, {}
+
+    done: dict[int, int] = {}
+    for index, size in recorded.items():
+        if index >= len(layout):
+            continue
+        part = _part_path(out, layout[index])
+        if part.exists() and part.stat().st_size == size:
+            done[index] = size
+
+    return layout, done
+
+
+def _write_manifest(path: Path, fingerprints: dict[str, str], layout: list[EncodeChunk], done: dict[int, int]) -> None:
+    manifest = {
+        **fingerprints,
+        "chunks": [list(chunk) for chunk in layout],
+        "done": {str(index): size for index, size in sorted(done.items())},
+    }
+    storage.write_atomic(path, json.dumps(manifest, indent=2))
+
+
+def _read_index(path: Path, out: Path, fingerprints: dict[str, str]) -> tuple[list[EncodeChunk], list[int]] | None:
+    """
+    Chunk layout and chunk sizes of a finished encode, if it was made with the
+    same fingerprints and matches the stream on disk.
+    """
+
+    try:
+        index = json.loads(path.read_text(encoding="utf-8"))
+        if any(index.get(name) != value for name, value in fingerprints.items()):
+            return None
+
+        layout = [EncodeChunk(*chunk) for chunk in index["chunks"]]
+        sizes = [int(size) for size in index["sizes"]]
+    except (OSError, KeyError, TypeError, ValueError):
+        return None
+
+    if len(sizes) != len(layout) or sum(sizes) != out.stat().st_size:
+        return None
+
+    return layout, sizes
+
+
+def _write_index(path: Path, fingerprints: dict[str, str], layout: list[EncodeChunk], sizes: list[int]) -> None:
+    index = {**fingerprints, "chunks": [list(chunk) for chunk in layout], "sizes": sizes}
+    storage.write_atomic(path, json.dumps(index, indent=2))
+
+
+def _save_hashes(path: Path, hashes: npt.NDArray[np.uint8]) -> None:
+    import numpy as np
+
+    temp_path = path.with_name(f"{path.stem}.tmp.npy")
+    np.save(temp_path, hashes)
+    temp_path.replace(path)
+
+
+def _hash_frame(f: vs.VideoFrame) -> bytes:
+    import numpy as np
+
+    h = blake2b(digest_size=16)
+    for p in range(f.format.num_planes):
+        # Planes are padded to their stride, which isn't part of the contents.
+        h.update(np.ascontiguousarray(f[p]))
+    return h.digest()
+
+
+def _copy_bytes(src: BinaryIO, dst: BinaryIO, size: int) -> None:
+    while size > 0:
+        buffer = src.read(min(size, 1 << 24))
+        if not buffer:
+            raise EOFError("Stream ended early.")
+        dst.write(buffer)
+        size -= len(buffer)
+
+
+def _script_fingerprint() -> str:
+    """
+    Hash of the running script's contents, or an empty string without one.
+    """
+
+    import __main__
+
+    script = getattr(__main__, "__file__", None)
+    if not script or not Path(script).is_file():
+        return ""
+
+    return sha256(Path(script).read_bytes()).hexdigest()[:32]
+
+
+def _join_chunks(parts: list[Path], out: Path) -> None:
+    """
+    Concatenates the parts' elementary streams into `out`.
+    """
+
+    temp_path = out.with_name(f"{out.name}.tmp")
+    with temp_path.open("wb") as f:
+        for part in parts:
+            with part.open("rb") as chunk:
+                shutil.copyfileobj(chunk, f)
+    temp_path.replace(out)
+
+
+def _part_path(out: Path, chunk: EncodeChunk) -> Path:
+    """
+    Where a chunk of `out` is encoded to.
+    """
+
+    return out.with_name(f"{out.stem}.part_{chunk.position:03d}{out.suffix}")
+
+
+def _encode_chunk(
+    encoder: x265,
+    settings: list[str],
+    clip: vs.VideoNode,
+    keyframes: Keyframes | list[int],
+    zones: list[Zone],
+    out: Path,
+    chunk: EncodeChunk,
+    progress: Callable[[int, int], None],
+) -> Path:
+    path = _part_path(out, chunk)
+    temp_path = path.with_name(f"{path.name}.tmp")
+    qpfile = path.with_name(f"{path.name}.qpfile.txt")
+
+    qpfile.write_text(
+        "".join(f"{n - chunk.start} I -1\n" for n in sorted(set(keyframes)) if chunk.start < n < chunk.stop),
+        encoding="utf-8",
+    )
+
+    args = [encoder.executable, "-o", str(temp_path.resolve()), "--qpfile", str(qpfile.resolve())]
+    args += settings
+    args += _chunk_zone_args(zones, chunk)
+    args += [
+        *encoder.get_custom_args(),
+        "--frames",
+        str(chunk.num_frames),
+        "--log-level",
+        "error",
+        "--y4m",
+        "--input",
+        "-",
+    ]
+
+    try:
+        with subprocess.Popen(args, stdin=subprocess.PIPE) as process:  # noqa: S603
+            assert process.stdin is not None
+            encoder.update_process_affinity(process.pid)
+            clip[chunk.start : chunk.stop].output(process.stdin, y4m=True, progress_update=progress)
+            process.stdin.close()
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        qpfile.unlink(missing_ok=True)
+
+    if process.returncode:
+        temp_path.unlink(missing_ok=True)
+        raise RuntimeError(f"x265 exited with code {process.returncode} on frames {chunk.start}-{chunk.stop - 1}.")
+
+    temp_path.replace(path)
+    return path
+
+
+def _x265_settings(encoder: x265, clip: vs.VideoNode) -> list[str]:
+    """
+    The encoder's settings as arguments, with the clip's props filled in or
+    added the way `x265.encode()` does, without touching the encoder.
+    """
+
+    from vsmuxtools.video.clip_metadata import fill_props, props_args
+
+    settings = encoder.settings
+    if isinstance(settings, str) and getattr(encoder, "was_file", False):
+        settings = fill_props(settings, clip, x265=True, sar=encoder.sar)
+
+    args = shlex.split(settings) if isinstance(settings, str) else list(settings)
+    if encoder.add_props:
+        args += props_args(clip, x265=True, sar=encoder.sar)
+
+    return args
+
+
+def _chunk_zone_args(zones: list[Zone], chunk: EncodeChunk) -> list[str]:
+    from vsmuxtools.video.settings import zones_to_args
+
+    chunk_zones: list[Zone] = []
+    for start, end, *params in zones:
+        assert start is not None
+        assert end is not None
+        if start < chunk.stop and end >= chunk.start:
+            zone = (max(start, chunk.start) - chunk.start, min(end, chunk.stop - 1) - chunk.start, *params)
+            chunk_zones.append(zone)  # type: ignore[arg-type]
+
+    return zones_to_args(chunk_zones, x265=True)
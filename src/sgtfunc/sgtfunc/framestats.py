@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import os
+import time
+import weakref
+from collections.abc import Callable, Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING, ClassVar, Literal
+
+from . import storage
+from .render import render_frames
+
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    from vstools import vs
+
+StatsColumn = Literal["planestats", "pict_type", "adb"]
+
+
+class FrameStatsStore:
+    """
+    On-disk store of per-frame statistics for a source, so that repeated
+    comparison prep against the same file doesn't have to decode it again.
+
+    Three column groups are recorded, each filled independently and only for
+    the frames that are actually requested:
+
+    - `planestats`: luma `PlaneStatsAverage`, `PlaneStatsMin` and `PlaneStatsMax`.
+    - `pict_type`: `_PictType` as an ASCII code (0 when unknown).
+    - `adb`: `Adb_EdgeValRefDiff`, `Adb_YNextDiff` and `Adb_YPrevDiff` from
+      `adb_heuristics()`.
+
+    The store is keyed by the source's resolved path, size and modification
+    time plus a fingerprint of the clip. Since a filter graph can't be
+    introspected, any filtering done on top of the source should be described
+    by `key`.
+
+    Example usage::
+
+      stats = FrameStatsStore(clip, FILE)
+      frames = sgtfunc.lazylist(clip, stats=stats)
+    """
+
+    max_cache_size: ClassVar[int] = 1 << 30
+    """Total size in bytes that the cache directory is trimmed down to on the first save of a run."""
+
+    save_interval: ClassVar[float] = 30.0
+    """
+    Minimum number of seconds between the saves made as statistics are
+    gathered. Whatever is left unsaved is written once a column is complete,
+    when the store is garbage collected or when the interpreter exits.
+    """
+
+    _evicted: ClassVar[set[Path]] = set()
+
+    def __init__(
+        self,
+        clip: vs.VideoNode,
+        source_file: str | os.PathLike[str],
+        key: str = "",
+        *,
+        cache_dir: str | os.PathLike[str] | None = None,
+    ) -> None:
+        """
+        :param clip: Clip that the statistics are gathered from.
+        :param source_file: Path to the file `clip` was indexed from.
+        :param key: Free-form description of any filtering applied to the source.
+        :param cache_dir: Directory to store statistics in. Defaults to
+            `.vsjet/sgtfunc/framestats` next to the running script.
+        """
+
+        import numpy as np
+
+        self.clip = clip
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else storage.cache_dir("framestats")
+        self.path = self.cache_dir / f"{storage.fingerprint(source_file, *storage.clip_info(clip), key)}.npz"
+
+        num_frames = clip.num_frames
+        self._columns: dict[StatsColumn, npt.NDArray[np.generic]] = {
+            "planestats": np.zeros((num_frames, 3), np.float64),
+            "pict_type": np.zeros(num_frames, np.uint8),
+            "adb": np.zeros((num_frames, 3), np.float64),
+        }
+        self._filled: dict[StatsColumn, npt.NDArray[np.bool_]] = {
+            column: np.zeros(num_frames, np.bool_) for column in self._columns
+        }
+
+        self._load()
+
+        # Whether there are statistics that haven't been written yet, shared
+        # with the finalizer, which mustn't hold on to the store itself.
+        self._unsaved = [False]
+        self._last_save = time.monotonic()
+        weakref.finalize(self, _flush, self.path, self._columns, self._filled, self._unsaved)
+
+    def plane_stats(self, frames: Iterable[int] | None = None) -> npt.NDArray[np.float64]:
+        """
+        Luma PlaneStats of the given frames (defaults to all of them) as an
+        array of shape `(n, 3)` holding the average, minimum and maximum.
+        """
+
+        from vstools import get_prop
+
+        def read(_: int, f: vs.VideoFrame) -> tuple[float, float, float]:
+            return (
+                get_prop(f, "PlaneStatsAverage", float),
+                get_prop(f, "PlaneStatsMin", float),
+                get_prop(f, "PlaneStatsMax", float),
+            )
+
+        return self._get("planestats", frames, lambda: self.clip.std.PlaneStats(), read)  # type: ignore[return-value]
+
+    def picture_types(self, frames: Iterable[int] | None = None) -> npt.NDArray[np.uint8]:
+        """
+        `_PictType` of the given frames (defaults to all of them) as ASCII
+        codes, e.g. `ord("I")`. Frames without a picture type are 0.
+        """
+
+        return self._get("pict_type", frames, lambda: self.clip, read_picture_type)  # type: ignore[return-value]
+
+    def adb_props(self, frames: Iterable[int] | None = None) -> npt.NDArray[np.float64]:
+        """
+        `adb_heuristics()` props of the given frames (defaults to all of them)
+        as an array of shape `(n, 3)` in the order of `AdbPropsTuple`.
+        """
+
+        from .sgtfunc import adb_heuristics, adb_props
+
+        return self._get("adb", frames, lambda: adb_heuristics(self.clip), lambda _, f: adb_props(f))  # type: ignore[return-value]
+
+    def _get(
+        self,
+        column: StatsColumn,
+        frames: Iterable[int] | None,
+        node: Callable[[], vs.VideoNode],
+        read: Callable[[int, vs.VideoFrame], object],
+    ) -> npt.NDArray[np.generic]:
+        import numpy as np
+
+        indices = np.arange(self.clip.num_frames) if frames is None else np.fromiter(frames, np.intp)
+
+        values, filled = self._columns[column], self._filled[column]
+        missing = np.unique(indices[~filled[indices]])
+        if missing.size:
+            values[missing] = render_frames(
+                node(), missing.tolist(), read, progress=f"Gathering {column} ({missing.size} frames)..."
+            )
+            filled[missing] = True
+
+            # Scene-based callers come in once per scene, so only save every
+            # so often rather than rewriting the whole store each time.
+            self._unsaved[0] = True
+            if filled.all() or time.monotonic() - self._last_save >= self.save_interval:
+                self.save()
+
+        return values[indices]
+
+    def _load(self) -> None:
+        import numpy as np
+
+        if not self.path.exists():
+            return
+
+        try:
+            with np.load(self.path) as data:
+                for column in self._columns:
+                    self._columns[column] = np.array(data[column])
+                    self._filled[column] = np.array(data[f"{column}_filled"])
+        except (OSError, KeyError, ValueError):
+            # Unreadable or from an older layout; start over.
+            self.path.unlink(missing_ok=True)
+            return
+
+        # Mark the entry as recently used for eviction.
+        self.path.touch()
+
+    def flush(self) -> None:
+        """
+        Writes the store to disk if it has unsaved statistics.
+        """
+
+        if self._unsaved[0]:
+            self.save()
+
+    def save(self) -> None:
+        """
+        Writes the store to disk. The first save to a cache directory in a run
+        also trims it down to `max_cache_size`.
+        """
+
+        _write(self.path, self._columns, self._filled)
+
+        self._unsaved[0] = False
+        self._last_save = time.monotonic()
+
+        if self.cache_dir not in self._evicted:
+            self._evicted.add(self.cache_dir)
+            self.evict(self.max_cache_size, self.cache_dir, keep=self.path)
+
+    @classmethod
+    def evict(
+        cls,
+        max_size: int,
+        cache_dir: str | os.PathLike[str] | None = None,
+        *,
+        keep: Path | None = None,
+    ) -> list[Path]:
+        """
+        Deletes the least recently used stores until the cache directory is at
+        most `max_size` bytes.
+
+        :return: Paths of the deleted stores.
+        """
+
+        cache_dir = Path(cache_dir) if cache_dir is not None else storage.cache_dir("framestats")
+        if not cache_dir.is_dir():
+            return []
+
+        entries = sorted(
+            ((p, p.stat()) for p in cache_dir.glob("*.npz") if not p.name.endswith(".tmp.npz")),
+            key=lambda x: x[1].st_mtime_ns,
+        )
+        total = sum(st.st_size for _, st in entries)
+
+        evicted = list[Path]()
+        for path, st in entries:
+            if total <= max_size:
+                break
+
+            if path == keep:
+                continue
+
+            path.unlink(missing_ok=True)
+            total -= st.st_size
+            evicted.append(path)
+
+        return evicted
+
+
+def _write(
+    path: Path, columns: dict[StatsColumn, npt.NDArray[np.generic]], filled: dict[StatsColumn, npt.NDArray[np.bool_]]
+) -> None:
+    import numpy as np
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Write to a temporary file first so that an interrupted save doesn't
+    # leave a truncated store behind.
+    temp_path = path.with_suffix(".tmp.npz")
+    np.savez(temp_path, **columns, **{f"{column}_filled": x for column, x in filled.items()})
+    temp_path.replace(path)
+
+
+def _flush(
+    path: Path,
+    columns: dict[StatsColumn, npt.NDArray[np.generic]],
+    filled: dict[StatsColumn, npt.NDArray[np.bool_]],
+    unsaved: list[bool],
+) -> None:
+    """
+    Writes a store that was garbage collected or is still open at exit, if it
+    has unsaved statistics.
+    """
+
+    if unsaved[0]:
+        _write(path, columns, filled)
+        unsaved[0] = False
+
+
+def read_picture_type(_: int, f: vs.VideoFrame) -> int:
+    """
+    Reads a frame's `_PictType` as an ASCII code, or 0 if it has none.
+    """
+
+    from vstools import get_prop
+
+    pict_type = get_prop(f, "_PictType", bytes, default=b"")
+    return pict_type[0] if pict_type else 0
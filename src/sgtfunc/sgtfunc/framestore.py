@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+from collections.abc import Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING, Self
+
+if TYPE_CHECKING:
+    from io import BufferedRandom
+    from types import TracebackType
+
+    import numpy as np
+    import numpy.typing as npt
+    from vstools import vs
+
+_MAGIC = b"SGTRAW01"
+_HEADER_SIZE = 4096
+_ALIGNMENT = 4096
+
+
+def _align(size: int) -> int:
+    return -(-size // _ALIGNMENT) * _ALIGNMENT
+
+
+class RawFrameStore:
+    """
+    Raw planar frames of a clip in a single preallocated, memory-mapped file,
+    for caching expensive stages without going through a codec.
+
+    The file holds a small header describing the clip, one completion byte per
+    frame and then every frame at a fixed, page-aligned stride with its planes
+    packed one after the other. Any frame can thus be read or written in O(1)
+    by its number, and a render that was interrupted resumes from the frames
+    that are still missing.
+
+    The file is sparse until frames are written, but a full 1080p 16-bit 4:2:0
+    episode still takes around 200 GB, so clean up after yourself.
+
+    Clips returned by `clip()` read straight from the mapping, so the store has
+    to stay open for as long as they are used.
+
+    Example usage::
+
+      store = RawFrameStore("upscaled.raw", upscaled)
+      store.fill()
+      upscaled = store.clip()
+    """
+
+    def __init__(self, path: str | os.PathLike[str], clip: vs.VideoNode) -> None:
+        """
+        Opens the store at `path`, creating it if it doesn't exist or was made
+        for a clip with a different format, size, length or frame rate.
+
+        :param path: File to store the frames in.
+        :param clip: Clip that the frames are rendered from.
+        """
+
+        import numpy as np
+        from vstools import vs
+
+        self.path = Path(path)
+        self.source = clip
+
+        fmt = clip.format
+        self._dtype = np.dtype(f"{'u' if fmt.sample_type == vs.INTEGER else 'f'}{fmt.bytes_per_sample}")
+        self._plane_shapes = [
+            (clip.height >> (fmt.subsampling_h if p else 0), clip.width >> (fmt.subsampling_w if p else 0))
+            for p in range(fmt.num_planes)
+        ]
+        self._plane_offsets: list[int] = []
+        offset = 0
+        for height, width in self._plane_shapes:
+            self._plane_offsets.append(offset)
+            offset += height * width * self._dtype.itemsize
+
+        self.frame_size = _align(offset)
+        self._completed_offset = _HEADER_SIZE
+        self._data_offset = _HEADER_SIZE + _align(clip.num_frames)
+        self.file_size = self._data_offset + clip.num_frames * self.frame_size
+
+        self._meta = {
+            "format": fmt.name,
+            "width": clip.width,
+            "height": clip.height,
+            "num_frames": clip.num_frames,
+            "fps": [clip.fps.numerator, clip.fps.denominator],
+            "frame_size": self.frame_size,
+        }
+
+        self._file = self._open()
+        self._mmap = mmap.mmap(self._file.fileno(), self.file_size)
+        self.completed: npt.NDArray[np.bool_] = np.frombuffer(
+            self._mmap, np.bool_, clip.num_frames, self._completed_offset
+        )
+        """Per-frame completion map, backed by the file."""
+
+    def _open(self) -> BufferedRandom:
+        meta = json.dumps(self._meta).encode()
+        header = _MAGIC + struct.pack("<I", len(meta)) + meta
+        if len(header) > _HEADER_SIZE:
+            raise ValueError("Clip description doesn't fit in the header.")
+
+        if self.path.exists() and self.path.stat().st_size == self.file_size:
+            f = self.path.open("r+b")
+            if f.read(len(header)) == header:
+                return f
+            f.close()
+
+        # New or made for another clip, start over. Truncating to the full size
+        # keeps the file sparse until frames are written.
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        f = self.path.open("w+b")
+        f.write(header)
+        f.truncate(self.file_size)
+        return f
+
+    def missing(self) -> npt.NDArray[np.intp]:
+        """
+        Numbers of the frames that haven't been written yet.
+        """
+
+        import numpy as np
+
+        return np.flatnonzero(~self.completed)
+
+    def planes(self, n: int) -> list[npt.NDArray[np.generic]]:
+        """
+        Views of frame `n`'s planes, straight into the mapped file.
+        """
+
+        import numpy as np
+
+        if not 0 <= n < self.completed.size:
+            raise IndexError(f"Frame {n} is out of range.")
+
+        base = self._data_offset + n * self.frame_size
+        return [
+            np.ndarray(shape, self._dtype, self._mmap, base + offset)
+            for shape, offset in zip(self._plane_shapes, self._plane_offsets, strict=True)
+        ]
+
+    def write(self, n: int, f: vs.VideoFrame) -> None:
+        """
+        Copies a frame into the store and marks it as completed.
+        """
+
+        import numpy as np
+
+        for p, plane in enumerate(self.planes(n)):
+            np.copyto(plane, np.asarray(f[p]))
+
+        self.completed[n] = True
+
+    def fill(
+        self,
+        frames: Iterable[int] | None = None,
+        *,
+        requests: int | None = None,
+        progress: str | None = "Filling frame store...",
+    ) -> None:
+        """
+        Renders the given frames (defaults to all of them) from the source clip
+        if they haven't been written yet.
+        """
+
+        from .render import render_frames
+
+        missing = self.missing().tolist() if frames is None else [n for n in frames if not self.completed[n]]
+
+        try:
+            render_frames(self.source, missing, self.write, requests=requests, progress=progress)
+        finally:
+            self.flush()
+
+    def clip(self) -> vs.VideoNode:
+        """
+        Clip that reads its frames back from the store. Requesting a frame that
+        hasn't been written raises an error.
+        """
+
+        import numpy as np
+        from vstools import core
+
+        blank = core.std.BlankClip(self.source, keep=True)
+
+        def read(n: int, f: vs.VideoFrame) -> vs.VideoFrame:
+            if not self.completed[n]:
+                raise ValueError(f'Frame {n} is missing from "{self.path}".')
+
+            fout = f.copy()
+            for p, plane in enumerate(self.planes(n)):
+                np.copyto(np.asarray(fout[p]), plane)
+            return fout
+
+        return blank.std.ModifyFrame(blank, read)
+
+    def flush(self) -> None:
+        """
+        Writes any pending changes to disk.
+        """
+
+        self._mmap.flush()
+
+    def close(self) -> None:
+        self.flush()
+        # The completion map is a view into the mapping, which has to go first.
+        del self.completed
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        self.close()
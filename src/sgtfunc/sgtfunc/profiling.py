@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections.abc import Sequence
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+if TYPE_CHECKING:
+    from vstools import vs
+
+
+class StageSpan(NamedTuple):
+    stage: str
+    frame: int
+    start: float
+    """Seconds from the start of the run until the frame was requested."""
+
+    end: float
+    """Seconds from the start of the run until the frame was done."""
+
+
+class StageStats(NamedTuple):
+    name: str
+    frames: int
+    inclusive: float
+    """Seconds spent on the stage's frames, including the stages before it."""
+
+    exclusive: float
+    """Seconds spent on the stage's frames, minus the previous stage's same frames."""
+
+    @property
+    def ms_per_frame(self) -> float:
+        return self.exclusive / self.frames * 1000 if self.frames else 0.0
+
+
+class StageProfile(NamedTuple):
+    frames: int
+    seconds: float
+    """Wall time of the whole run."""
+
+    stages: list[StageStats]
+    """Stages, costliest first."""
+
+    spans: list[StageSpan]
+
+    @property
+    def fps(self) -> float:
+        return self.frames / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        total = sum(stage.exclusive for stage in self.stages) or 1.0
+        lines = [f"{self.frames} frames in {self.seconds:.2f} s ({self.fps:.2f} fps):"]
+        lines += [
+            f"  {stage.name:<16}{stage.exclusive:8.2f} s{stage.exclusive / total:8.1%}{stage.ms_per_frame:10.1f} ms/frame"
+            for stage in self.stages
+        ]
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> dict[str, Any]:
+        """
+        The spans as Chrome trace events, for `chrome://tracing` or Perfetto.
+        Every frame gets its own track, on which each stage is nested inside
+        the stages after it.
+        """
+
+        events: list[dict[str, Any]] = [
+            {"name": "process_name", "ph": "M", "pid": 1, "tid": 1, "args": {"name": "VapourSynth"}}
+        ]
+        for span in sorted(self.spans, key=lambda s: (s.start, -s.end)):
+            common = {"name": span.stage, "cat": "stage", "id": span.frame, "pid": 1, "tid": 1}
+            events.append({**common, "ph": "b", "ts": span.start * 1e6, "args": {"frame": span.frame}})
+            events.append({**common, "ph": "e", "ts": span.end * 1e6})
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str | os.PathLike[str]) -> None:
+        Path(path).write_text(json.dumps(self.chrome_trace()), encoding="utf-8")
+
+
+class StageProfiler:
+    """
+    Attributes render time to named stages of a filter graph.
+
+    Each stage's output is wrapped so that the time every frame is requested
+    and done is recorded, without touching the frames themselves. A stage's
+    own cost on a frame is the time between the two, minus the time spent on
+    the same frame of the stage wrapped before it. Stages should thus be
+    wrapped in the order they are applied, and the wrapped clip used
+    downstream. Temporal stages also wait on neighbouring frames of the stage
+    before them, which is counted towards their own cost.
+
+    A disabled profiler returns clips as is, so the wrapping can stay in
+    scripts.
+
+    Example usage::
+
+      profiler = StageProfiler()
+      denoised = profiler.stage(sgtfunc.denoise(src), "denoise")
+      rescaled = profiler.stage(Rescale(denoised, ...).upscale, "rescale")
+      print(profile := profiler.run(rescaled))
+      profile.write_chrome_trace("trace.json")
+    """
+
+    def __init__(self, *, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.names: list[str] = []
+        """Names of the wrapped stages, in the order they were wrapped."""
+
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._started: dict[tuple[str, int], float] = {}
+        self._spans: list[StageSpan] = []
+
+    def stage(self, clip: vs.VideoNode, name: str) -> vs.VideoNode:
+        """
+        Wraps the output of a stage.
+        """
+
+        if not self.enabled:
+            return clip
+
+        if name in self.names:
+            raise ValueError(f'Stage "{name}" is already wrapped.')
+        self.names.append(name)
+
+        def requested(n: int) -> vs.VideoNode:
+            with self._lock:
+                self._started[(name, n)] = time.perf_counter() - self._origin
+            return clip
+
+        def done(n: int, f: vs.VideoFrame) -> vs.VideoFrame:
+            end = time.perf_counter() - self._origin
+            with self._lock:
+                start = self._started.pop((name, n), end)
+                self._spans.append(StageSpan(name, n, start, end))
+            return f
+
+        timed = clip.std.FrameEval(requested)
+        return timed.std.ModifyFrame(timed, done)
+
+    def run(
+        self,
+        clip: vs.VideoNode,
+        frames: Sequence[int] | None = None,
+        *,
+        requests: int | None = None,
+    ) -> StageProfile:
+        """
+        Renders frames of a clip containing the wrapped stages and attributes
+        the time spent to each of them.
+
+        :param clip: Clip to render, usually the final output.
+        :param frames: Frames to render. Defaults to 100 consecutive frames from
+            the middle of the clip, as temporal stages work best on runs of
+            frames.
+        :param requests: Maximum number of frames in flight.
+        """
+
+        from .render import render_frames
+
+        if frames is None:
+            start = max(clip.num_frames // 2 - 50, 0)
+            frames = range(start, min(start + 100, clip.num_frames))
+
+        with self._lock:
+            self._started.clear()
+            self._spans.clear()
+            self._origin = time.perf_counter()
+
+        render_frames(clip, frames, lambda *_: None, requests=requests, progress="Profiling...")
+        seconds = time.perf_counter() - self._origin
+
+        with self._lock:
+            spans = list(self._spans)
+
+        return StageProfile(len(frames), seconds, self._stats(spans), spans)
+
+    def _stats(self, spans: list[StageSpan]) -> list[StageStats]:
+        by_stage: dict[str, dict[int, StageSpan]] = {name: {} for name in self.names}
+        for span in spans:
+            by_stage[span.stage][span.frame] = span
+
+        stats: list[StageStats] = []
+        for i, name in enumerate(self.names):
+            previous = by_stage[self.names[i - 1]] if i else {}
+
+            inclusive = exclusive = 0.0
+            for n, span in by_stage[name].items():
+                duration = span.end - span.start
+                inclusive += duration
+
+                if (before := previous.get(n)) is not None:
+                    duration -= max(min(span.end, before.end) - max(span.start, before.start), 0.0)
+                exclusive += duration
+
+            stats.append(StageStats(name, len(by_stage[name]), inclusive, exclusive))
+
+        return sorted(stats, key=lambda s: s.exclusive, reverse=True)
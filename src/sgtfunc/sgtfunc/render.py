@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future
+from typing import TypeVar
+
+from vstools import vs
+
+T = TypeVar("T")
+
+
+def render_frames(  # noqa: UP047
+    clip: vs.VideoNode,
+    frames: Iterable[int],
+    callback: Callable[[int, vs.VideoFrame], T],
+    *,
+    requests: int | None = None,
+    progress: str | None = None,
+) -> list[T]:
+    """
+    Renders an arbitrary set of frames with a bounded number of requests in
+    flight, passing each frame to `callback` in the order given.
+
+    Unlike `vstools.clip_async_render()` this does not have to go through the
+    whole clip, so it is suited for sparse or reordered frame lists.
+
+    :param clip: Clip to render.
+    :param frames: Frame numbers to render.
+    :param callback: Called with each frame number and frame. Its return values
+        are collected in the order of `frames`. The frame is closed once the
+        callback returns, so don't hold on to it.
+    :param requests: Maximum number of frame requests in flight. Defaults to
+        the core's thread count.
+    :param progress: Optional message to show alongside a progress bar.
+
+    :return: List of the callback's return values.
+    """
+
+    from vstools import get_render_progress
+
+    frames = list(frames)
+    results = list[T]()
+
+    if progress and frames:
+        with get_render_progress(progress, len(frames)) as p:
+            for result in iter_frames(clip, frames, callback, requests=requests):
+                results.append(result)
+                p.update(advance=1)
+    else:
+        results.extend(iter_frames(clip, frames, callback, requests=requests))
+
+    return results
+
+
+def iter_frames(  # noqa: UP047
+    clip: vs.VideoNode,
+    frames: Iterable[int],
+    callback: Callable[[int, vs.VideoFrame], T],
+    *,
+    requests: int | None = None,
+) -> Iterator[T]:
+    """
+    Streaming version of `render_frames()` that yields each callback result as
+    soon as its frame is done, keeping up to `requests` frames in flight.
+    """
+
+    requests = max(requests or vs.core.num_threads, 1)
+
+    pending = deque[tuple[int, Future[vs.VideoFrame]]]()
+    remaining = iter(frames)
+
+    def request_next() -> None:
+        if (n := next(remaining, None)) is not None:
+            pending.append((n, clip.get_frame_async(n)))
+
+    for _ in range(requests):
+        request_next()
+
+    while pending:
+        n, future = pending.popleft()
+        with future.result() as f:
+            result = callback(n, f)
+        request_next()
+
+        yield result
@@ -0,0 +1,457 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from . import storage
+from .render import iter_frames
+from .streamstats import RunningStats
+
+if TYPE_CHECKING:
+    from vstools import Keyframes, vs
+
+
+@dataclass
+class SceneRescaleStats:
+    kernel: str
+    """Kernel name."""
+
+    scene_idx: int = 0
+    """Scene index."""
+
+    mean: float = 0.0
+    """Arithmetic mean (average)."""
+
+    median: float = 0.0
+    """Median."""
+
+    stdev: float = 0.0
+    """Standard deviation."""
+
+
+@dataclass
+class SceneRescaleReport:
+    best: SceneRescaleStats
+    """Stats of the kernel with the minimum average error."""
+
+    frame_range: range
+    """Frames of the scene."""
+
+    seconds: float
+    """Wall time spent rendering the scene, 0 if it was cached."""
+
+    kernels: list[SceneRescaleStats]
+    """Stats of every kernel."""
+
+
+@dataclass
+class SceneRaceResult:
+    best: SceneRescaleStats
+    """Stats of the kernel with the minimum average error among the survivors."""
+
+    survivors: list[str]
+    """Kernels with stats over every frame of the scene, rendered now or cached before."""
+
+    eliminated: dict[str, int]
+    """Kernels that were dropped early, with the number of frames they were rendered on."""
+
+    frames_rendered: int
+    """Total number of frames rendered across all kernels."""
+
+    uncertain: bool
+    """Whether another survivor's error is within the confidence interval of the best one."""
+
+
+class SceneRescaleErrors(dict[int, SceneRescaleStats]):
+    """
+    Finds the kernel with the minimum average rescale error per scene.
+
+    All kernels of a scene are rendered together in one pass, and the per-kernel
+    results are persisted to disk keyed by the source, `key` and the scene's
+    frame range, so they survive vspreview reloads and later runs. Describe the
+    rescale parameters (kernels, heights, masks) in `key`.
+
+    Example usage::
+
+      rescales = {name: src.std.MaskedMerge(rescaled, line_mask).std.PlaneStats(src) for ...}
+      scene_errors = SceneRescaleErrors(rescales, keyframes, FILE, key=f"{HEIGHT} {BASE_HEIGHT}")
+      best = scene_errors[scene_idx]
+    """
+
+    def __init__(
+        self,
+        rescales: Mapping[str, vs.VideoNode],
+        keyframes: Keyframes,
+        source_file: str | os.PathLike[str] | None = None,
+        key: str = "",
+        *,
+        prop: str = "PlaneStatsDiff",
+        cache_dir: str | os.PathLike[str] | None = None,
+        requests: int | None = None,
+        exact: bool = False,
+        racing: bool = False,
+    ) -> None:
+        """
+        :param rescales: Mapping of kernel names to clips with the per-frame error in `prop`.
+        :param keyframes: Scenes to evaluate.
+        :param source_file: File the clips were indexed from. If None, results
+            are only kept in memory.
+        :param key: Free-form description of the rescale parameters.
+        :param prop: Frame prop holding the error.
+        :param cache_dir: Directory to persist results in. Defaults to
+            `.vsjet/sgtfunc/scene_rescale` next to the running script.
+        :param requests: Maximum number of frames in flight per scene.
+        :param exact: Keep every frame's error for an exact median. Otherwise the
+            statistics are accumulated in constant memory and the median is
+            approximate.
+        :param racing: Pick each scene's kernel with `race()` when indexing,
+            which only renders kernels on the whole scene while they are still
+            in contention.
+        """
+
+        super().__init__()
+
+        self.rescales = dict(rescales)
+        self.keyframes = keyframes
+        self.prop = prop
+        self.requests = requests
+        self.exact = exact
+        self.racing = racing
+
+        self.num_frames = min(clip.num_frames for clip in self.rescales.values())
+
+        self.path: Path | None = None
+        self._results: dict[str, dict[str, list[float]]] = {}
+        self._races: dict[str, dict[str, Any]] = {}
+        if source_file is not None:
+            directory = Path(cache_dir) if cache_dir is not None else storage.cache_dir("scene_rescale")
+            self.path = directory / f"{storage.fingerprint(source_file, self.prop, self.exact, key)}.json"
+            self._load()
+
+    def __getitem__(self, idx: int) -> SceneRescaleStats:
+        # If previously calculated, return early.
+        if idx in self:
+            return super().__getitem__(idx)
+
+        entry = self._scene_entry(idx)
+        race_marker = self._races.get(self._scene_key(idx))
+
+        if (
+            self.racing
+            and race_marker is not None
+            and race_marker["winner"] in self.rescales
+            and all(name in entry or name in race_marker["eliminated"] for name in self.rescales)
+        ):
+            # Raced before, which leaves out the eliminated kernels' stats.
+            min_avg_error = SceneRescaleStats(race_marker["winner"], idx, *entry[race_marker["winner"]])
+        elif self.racing and any(name not in entry for name in self.rescales):
+            race = self.race(idx)
+            if race.uncertain:
+                others = ", ".join(name for name in race.survivors if name != race.best.kernel)
+                print(f"Scene {idx}: {race.best.kernel} is not a clear winner over {others}.")
+
+            min_avg_error = race.best
+        else:
+            min_avg_error = min(self.kernel_stats(idx).values(), key=lambda x: x.mean)
+
+        self[idx] = min_avg_error
+        return min_avg_error
+
+    def scene_range(self, idx: int) -> range:
+        """
+        Frame range of a scene, clamped to the clips' length.
+        """
+
+        frame_range = self.keyframes.scenes[idx]
+        return range(frame_range.start, min(frame_range.stop, self.num_frames))
+
+    def _scene_key(self, idx: int) -> str:
+        frame_range = self.scene_range(idx)
+        return f"{frame_range.start}-{frame_range.stop}"
+
+    def _scene_entry(self, idx: int) -> dict[str, list[float]]:
+        return self._results.setdefault(self._scene_key(idx), {})
+
+    def kernel_stats(self, idx: int) -> dict[str, SceneRescaleStats]:
+        """
+        Rescale error statistics of every kernel for a scene.
+        """
+
+        from vstools import core, get_prop
+
+        frame_range = self.scene_range(idx)
+        entry = self._scene_entry(idx)
+
+        if (missing := [name for name in self.rescales if name not in entry]) and not frame_range:
+            # Scenes past the end of the clips have no frames to render.
+            for name in missing:
+                entry[name] = _summarize(RunningStats())
+        elif missing:
+            # Line up the scene of every missing kernel so that they are all
+            # requested together.
+            cuts = core.std.Splice(
+                [self.rescales[name][frame_range.start : frame_range.stop] for name in missing], mismatch=True
+            )
+            errors = iter_frames(
+                cuts, range(cuts.num_frames), lambda _, f: get_prop(f, self.prop, float), requests=self.requests
+            )
+
+            accumulators = {name: RunningStats(exact=self.exact) for name in missing}
+            for i, error in enumerate(errors):
+                accumulators[missing[i // len(frame_range)]].push(error)
+
+            for name, stats in accumulators.items():
+                entry[name] = _summarize(stats)
+
+            self._save()
+
+        return {name: SceneRescaleStats(name, idx, *entry[name]) for name in self.rescales}
+
+    def race(self, idx: int, *, initial_frames: int = 8, z: float = 2.58) -> SceneRaceResult:
+        """
+        Picks the kernel for a scene by successive racing instead of rendering
+        every kernel on every frame.
+
+        Frames are drawn from the scene in a fixed random order, in batches
+        that double in size. After each batch, kernels whose confidence
+        interval for the mean error lies entirely above the current best
+        kernel's are dropped. Only the remaining kernels are rendered on the
+        whole scene, and their results are persisted like `kernel_stats()`
+        along with the outcome of the race, so the scene isn't raced again.
+        Kernels whose stats are already cached aren't rendered and race with
+        their exact mean.
+
+        :param idx: Scene index.
+        :param initial_frames: Number of frames in the first batch.
+        :param z: Width of the confidence intervals in standard errors.
+            Defaults to ~99%.
+
+        :return: The winner along with how the race went.
+        """
+
+        from random import Random
+
+        from vstools import core, get_prop
+
+        frame_range = self.scene_range(idx)
+        entry = self._scene_entry(idx)
+
+        if not frame_range:
+            kernel_stats = self.kernel_stats(idx)
+            return SceneRaceResult(next(iter(kernel_stats.values())), list(kernel_stats), {}, 0, uncertain=False)
+
+        # Seeded by the scene so that reruns render the same frames.
+        order = Random(frame_range.start).sample(frame_range, len(frame_range))
+
+        cached = {name: entry[name][0] for name in self.rescales if name in entry}
+        stats = {name: RunningStats(exact=self.exact) for name in self.rescales if name not in cached}
+        survivors = list(stats)
+        eliminated = dict[str, int]()
+        frames_rendered = 0
+
+        def mean(name: str) -> float:
+            return cached[name] if name in cached else stats[name].mean
+
+        def interval(name: str) -> tuple[float, float]:
+            if name in cached:
+                return cached[name], cached[name]
+
+            margin = z * stats[name].stdev / math.sqrt(stats[name].count)
+            return stats[name].mean - margin, stats[name].mean + margin
+
+        def contenders() -> list[str]:
+            return [*cached, *survivors]
+
+        done, batch_size = 0, max(initial_frames, 2)
+        while survivors and done < len(order):
+            # Once a single kernel is left, there's nothing to race against.
+            batch = order[done : done + batch_size] if len(contenders()) > 1 else order[done:]
+            done += len(batch)
+            batch_size *= 2
+
+            frames = core.std.Splice([self.rescales[name][n] for name in survivors for n in batch], mismatch=True)
+            errors = iter_frames(
+                frames, range(frames.num_frames), lambda _, f: get_prop(f, self.prop, float), requests=self.requests
+            )
+            for i, error in enumerate(errors):
+                stats[survivors[i // len(batch)]].push(error)
+            frames_rendered += frames.num_frames
+
+            if len(contenders()) > 1 and done < len(order):
+                _, best_upper = interval(min(contenders(), key=mean))
+                for name in survivors.copy():
+                    if interval(name)[0] > best_upper:
+                        survivors.remove(name)
+                        eliminated[name] = stats[name].count
+
+        for name in survivors:
+            entry[name] = _summarize(stats[name])
+
+        best = min(contenders(), key=mean)
+        _, best_upper = interval(best)
+
+        self._races[self._scene_key(idx)] = {"winner": best, "eliminated": eliminated}
+        self._save()
+
+        return SceneRaceResult(
+            SceneRescaleStats(best, idx, *entry[best]),
+            contenders(),
+            eliminated,
+            frames_rendered,
+            any(interval(name)[0] <= best_upper for name in contenders() if name != best),
+        )
+
+    def survey(
+        self,
+        scenes: Iterable[int] | None = None,
+        *,
+        report: str | os.PathLike[str] | None = None,
+        requests: int | None = None,
+    ) -> list[SceneRescaleReport]:
+        """
+        Evaluates every kernel on every scene in a single render loop with a
+        bounded number of frames in flight, so a whole episode's survey keeps
+        all cores busy instead of stalling at every scene boundary.
+
+        Results are printed and persisted as each scene completes.
+
+        :param scenes: Scene indices to evaluate. Defaults to all scenes.
+        :param report: Optional path to write a report to, as CSV if it ends in
+            `.csv` and as JSON otherwise.
+        :param requests: Maximum number of frames in flight. Defaults to the
+            core's thread count.
+
+        :return: Report rows in the order of `scenes`.
+        """
+
+        from time import perf_counter
+
+        from vstools import core, get_prop
+
+        scene_indices = list(self.keyframes.scenes) if scenes is None else list(scenes)
+
+        # Every (scene, kernel) pair that isn't cached yet, scene-major so that
+        # scenes complete one after another.
+        jobs: list[tuple[int, str, range]] = []
+        for idx in scene_indices:
+            entry = self._scene_entry(idx)
+            if frame_range := self.scene_range(idx):
+                jobs += [(idx, name, frame_range) for name in self.rescales if name not in entry]
+
+        rows = dict[int, SceneRescaleReport]()
+
+        def finish_scene(idx: int, seconds: float) -> None:
+            kernel_stats = self.kernel_stats(idx)
+            best = min(kernel_stats.values(), key=lambda x: x.mean)
+            self[idx] = best
+            rows[idx] = SceneRescaleReport(best, self.scene_range(idx), seconds, list(kernel_stats.values()))
+            print(f"{rows[idx].frame_range} {best} ({seconds:.2f}s)")
+
+        if jobs:
+            cuts = core.std.Splice(
+                [self.rescales[name][frame_range.start : frame_range.stop] for _, name, frame_range in jobs],
+                mismatch=True,
+            )
+            results = iter_frames(
+                cuts,
+                range(cuts.num_frames),
+                lambda _, f: get_prop(f, self.prop, float),
+                requests=requests or self.requests,
+            )
+
+            start = perf_counter()
+            for i, (idx, name, frame_range) in enumerate(jobs):
+                stats = RunningStats((next(results) for _ in frame_range), exact=self.exact)
+                self._scene_entry(idx)[name] = _summarize(stats)
+
+                if i + 1 == len(jobs) or jobs[i + 1][0] != idx:
+                    self._save()
+                    finish_scene(idx, perf_counter() - start)
+                    start = perf_counter()
+
+        # Scenes that were entirely cached.
+        for idx in scene_indices:
+            if idx not in rows:
+                finish_scene(idx, 0.0)
+
+        report_rows = [rows[idx] for idx in scene_indices]
+        if report is not None:
+            _write_report(Path(report), report_rows)
+
+        return report_rows
+
+    def _load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except ValueError:
+            self.path.unlink(missing_ok=True)
+            return
+
+        # Files from before races were recorded only hold the scenes.
+        if "scenes" not in data:
+            data = {"scenes": data}
+
+        self._results = data["scenes"]
+        self._races = data.get("races", {})
+
+    def _save(self) -> None:
+        if self.path is not None:
+            storage.write_atomic(self.path, json.dumps({"scenes": self._results, "races": self._races}))
+
+
+def _summarize(stats: RunningStats) -> list[float]:
+    if not stats.count:
+        return [math.nan] * 3
+
+    return [stats.mean, stats.median, stats.stdev]
+
+
+def _write_report(path: Path, rows: Sequence[SceneRescaleReport]) -> None:
+    import csv
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    if path.suffix.lower() == ".csv":
+        with path.open("w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["scene_idx", "start", "stop", "kernel", "mean", "median", "stdev", "seconds"])
+            for row in rows:
+                writer.writerow(
+                    [
+                        row.best.scene_idx,
+                        row.frame_range.start,
+                        row.frame_range.stop,
+                        row.best.kernel,
+                        row.best.mean,
+                        row.best.median,
+                        row.best.stdev,
+                        row.seconds,
+                    ]
+                )
+        return
+
+    path.write_text(
+        json.dumps(
+            [
+                {
+                    "scene_idx": row.best.scene_idx,
+                    "start": row.frame_range.start,
+                    "stop": row.frame_range.stop,
+                    "kernel": row.best.kernel,
+                    "seconds": row.seconds,
+                    "kernels": [asdict(x) for x in row.kernels],
+                }
+                for row in rows
+            ],
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import json
+import os
+from collections.abc import Callable, Iterable, Mapping
+from functools import cached_property
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from . import storage
+
+if TYPE_CHECKING:
+    from vstools import Keyframes, ScenePacketStats, vs
+
+
+class LazyClip:
+    """
+    Defers building a clip, and with it indexing its source, until it is first
+    used. Pass it to `SceneSourceSelector` in place of a clip so that sources
+    no scene is routed to are never opened.
+
+    Example usage::
+
+      bglobal = LazyClip(lambda: src_file(BGLOBAL_FILE, idx=source).init_cut())
+      merged = LazyClip(lambda: frequency_merge([adn.clip, amzn, bglobal.clip]))
+    """
+
+    def __init__(self, factory: Callable[[], vs.VideoNode]) -> None:
+        self.factory = factory
+
+    @cached_property
+    def clip(self) -> vs.VideoNode:
+        """
+        The clip, built on first access.
+        """
+
+        return self.factory()
+
+    @property
+    def loaded(self) -> bool:
+        """
+        Whether the clip has been built.
+        """
+
+        return "clip" in self.__dict__
+
+
+def resolve_clip(clip: vs.VideoNode | LazyClip) -> vs.VideoNode:
+    """
+    The clip itself, or a `LazyClip`'s clip.
+    """
+
+    return clip.clip if isinstance(clip, LazyClip) else clip
+
+
+class SceneSourceSelector:
+    """
+    Picks a source per scene. The mapping is decided once up front and the
+    output is a static splice of trims of the chosen sources, so unlike a
+    `FrameEval` or `SceneBasedDynamicCache` no Python runs per frame and
+    only the chosen source is requested for each scene.
+
+    Sources can be given as `LazyClip`s, which are only built if a scene is
+    routed to them. Pass `num_frames` in that case, as it otherwise defaults to
+    the shortest source and has to build all of them to find it.
+
+    Example usage::
+
+      selector = SceneSourceSelector.from_sets(
+          {"ADN": adn, "AMZN": amzn, "merged": merged},
+          keyframes,
+          {"ADN": ADN_SCENES, "AMZN": AMZN_SCENES},
+          default="merged",
+      )
+      selected = selector.clip()
+    """
+
+    def __init__(
+        self,
+        sources: Mapping[str, vs.VideoNode | LazyClip],
+        keyframes: Keyframes,
+        mapping: Mapping[int, str],
+        *,
+        num_frames: int | None = None,
+    ) -> None:
+        """
+        :param sources: Mapping of source names to clips or `LazyClip`s. They
+            must all have the same format and dimensions.
+        :param keyframes: Scenes of the sources.
+        :param mapping: Name of the source to use for every scene index.
+        :param num_frames: Length of the output. Defaults to the shortest source.
+        """
+
+        self.sources = dict(sources)
+        self.keyframes = keyframes
+        self.num_frames = (
+            num_frames if num_frames is not None else min(resolve_clip(c).num_frames for c in self.sources.values())
+        )
+
+        self.mapping: dict[int, str] = {}
+        for idx in self.scene_indices():
+            if idx not in mapping:
+                raise ValueError(f"Scene {idx} has no source.")
+            if mapping[idx] not in self.sources:
+                raise ValueError(f'Scene {idx} is mapped to an unknown source "{mapping[idx]}".')
+            self.mapping[idx] = mapping[idx]
+
+    @classmethod
+    def from_sets(
+        cls,
+        sources: Mapping[str, vs.VideoNode | LazyClip],
+        keyframes: Keyframes,
+        scenes: Mapping[str, Iterable[int]],
+        default: str,
+        *,
+        num_frames: int | None = None,
+    ) -> SceneSourceSelector:
+        """
+        Builds the mapping from explicit sets of scene indices per source, like
+        `ADN_SCENES`. A scene in several sets goes to the first one and scenes
+        in none of them go to `default`.
+        """
+
+        if num_frames is None:
+            num_frames = min(resolve_clip(c).num_frames for c in sources.values())
+
+        sets = {name: frozenset(indices) for name, indices in scenes.items()}
+        mapping = {
+            idx: next((name for name, s in sets.items() if idx in s), default)
+            for idx in _scene_indices(keyframes, num_frames)
+        }
+
+        return cls(sources, keyframes, mapping, num_frames=num_frames)
+
+    @classmethod
+    def from_packets(
+        cls,
+        sources: Mapping[str, vs.VideoNode | LazyClip],
+        source_files: Mapping[str, str | os.PathLike[str]],
+        keyframes: Keyframes,
+        choose: Callable[[Mapping[str, ScenePacketStats]], str] | None = None,
+        key: str = "",
+        *,
+        num_frames: int | None = None,
+        cache_dir: str | os.PathLike[str] | None = None,
+    ) -> SceneSourceSelector:
+        """
+        Builds the mapping by ranking sources on their packet sizes per scene,
+        read from the containers with `VideoPackets` without decoding anything.
+
+        The decision table is cached on disk keyed by the source files, the
+        keyframes and `key`, which should describe `choose` if it isn't the
+        default.
+
+        :param sources: Mapping of source names to clips.
+        :param source_files: Files of the candidate sources, by name. Sources
+            without a file, e.g. merges, are never picked.
+        :param keyframes: Scenes of the sources.
+        :param choose: Picks a source name given every candidate's packet size
+            statistics for a scene. Candidates without known packet sizes for
+            the scene are left out. Defaults to `choose_by_packet_size()`.
+        :param key: Free-form description of `choose`.
+        :param num_frames: Length of the output. Defaults to the shortest source.
+        :param cache_dir: Directory to store decision tables in. Defaults to
+            `.vsjet/sgtfunc/scene_source` next to the running script.
+        """
+
+        from vstools import ScenePacketStats, VideoPackets
+
+        if num_frames is None:
+            num_frames = min(resolve_clip(c).num_frames for c in sources.values())
+
+        directory = Path(cache_dir) if cache_dir is not None else storage.cache_dir("scene_source")
+        digest = storage.fingerprint(
+            None,
+            *(f"{name}={storage.fingerprint(path)}" for name, path in sorted(source_files.items())),
+            list(keyframes),
+            num_frames,
+            key,
+        )
+        path = directory / f"{digest}.json"
+
+        if path.exists():
+            return cls.load(path, sources, keyframes)
+
+        choose = choose or choose_by_packet_size
+        packets = {name: VideoPackets.from_video(file) for name, file in source_files.items()}
+
+        mapping: dict[int, str] = {}
+        for idx in _scene_indices(keyframes, num_frames):
+            frame_range = keyframes.scenes[idx]
+            stats: dict[str, ScenePacketStats] = {}
+            for name, sizes in packets.items():
+                # Unknown sizes are -1, and containers can have fewer packets
+                # than frames.
+                scene_sizes = [x for x in sizes[frame_range.start : min(frame_range.stop, num_frames)] if x >= 0]
+                if not scene_sizes:
+                    continue
+
+                stats[name] = ScenePacketStats(
+                    PktSceneAvgSize=sum(scene_sizes) / len(scene_sizes),
+                    PktSceneMaxSize=max(scene_sizes),
+                    PktSceneMinSize=min(scene_sizes),
+                )
+            if not stats:
+                raise ValueError(
+                    f"None of {', '.join(packets)} have packet sizes for scene {idx} "
+                    f"(frames {frame_range.start}-{min(frame_range.stop, num_frames) - 1})."
+                )
+
+            mapping[idx] = choose(stats)
+
+        selector = cls(sources, keyframes, mapping, num_frames=num_frames)
+        selector.save(path)
+
+        return selector
+
+    def scene_indices(self) -> range:
+        """
+        Indices of the scenes that start within the output.
+        """
+
+        return _scene_indices(self.keyframes, self.num_frames)
+
+    def scene_range(self, idx: int) -> range:
+        """
+        Frame range of a scene, clamped to the output's length.
+        """
+
+        frame_range = self.keyframes.scenes[idx]
+        return range(frame_range.start, min(frame_range.stop, self.num_frames))
+
+    def runs(self) -> list[tuple[str, range]]:
+        """
+        Consecutive scenes that use the same source, merged into a single frame
+        range each.
+        """
+
+        runs: list[tuple[str, range]] = []
+        for idx in self.scene_indices():
+            name, frame_range = self.mapping[idx], self.scene_range(idx)
+            if runs and runs[-1][0] == name:
+                runs[-1] = (name, range(runs[-1][1].start, frame_range.stop))
+            else:
+                runs.append((name, frame_range))
+
+        return runs
+
+    def clip(self) -> vs.VideoNode:
+        """
+        Splice of the chosen source's frames for every scene.
+        """
+
+        from vstools import core
+
+        trims: list[vs.VideoNode] = []
+        for name, frame_range in self.runs():
+            source = resolve_clip(self.sources[name])
+            if frame_range.stop > source.num_frames:
+                raise ValueError(
+                    f'Source "{name}" has {source.num_frames} frames, but frames up to {frame_range.stop - 1} '
+                    "are mapped to it."
+                )
+            trims.append(source[frame_range.start : frame_range.stop])
+
+        return core.std.Splice(trims)
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        The mapping along with the frame ranges it applies to, for inspection
+        and serialization.
+        """
+
+        return {
+            "num_frames": self.num_frames,
+            "scenes": [
+                {
+                    "scene": idx,
+                    "start": self.scene_range(idx).start,
+                    "stop": self.scene_range(idx).stop,
+                    "source": self.mapping[idx],
+                }
+                for idx in self.scene_indices()
+            ],
+        }
+
+    def save(self, path: str | os.PathLike[str]) -> None:
+        """
+        Writes the mapping to a JSON file.
+        """
+
+        storage.write_atomic(Path(path), json.dumps(self.to_dict(), indent=2))
+
+    @classmethod
+    def load(
+        cls,
+        path: str | os.PathLike[str],
+        sources: Mapping[str, vs.VideoNode | LazyClip],
+        keyframes: Keyframes,
+    ) -> SceneSourceSelector:
+        """
+        Reads a mapping written by `save()`. The scenes' frame ranges must match
+        `keyframes`.
+        """
+
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+
+        selector = cls(
+            sources,
+            keyframes,
+            {entry["scene"]: entry["source"] for entry in data["scenes"]},
+            num_frames=data["num_frames"],
+        )
+        for entry in data["scenes"]:
+            if selector.scene_range(entry["scene"]) != range(entry["start"], entry["stop"]):
+                raise ValueError(f"Scene {entry['scene']} doesn't match the keyframes in {path}.")
+
+        return selector
+
+
+def choose_by_packet_size(stats: Mapping[str, ScenePacketStats], tolerance: float = 0.1) -> str:
+    """
+    Picks the source with the largest average packet size in a scene. Sources
+    whose average is within `tolerance` of the largest are decided by their
+    largest packet instead, as that tends to be the keyframe.
+    """
+
+    best_avg = max(s["PktSceneAvgSize"] for s in stats.values())
+    close = [name for name, s in stats.items() if best_avg - s["PktSceneAvgSize"] <= tolerance * best_avg]
+
+    return max(close, key=lambda name: stats[name]["PktSceneMaxSize"])
+
+
+def _scene_indices(keyframes: Keyframes, num_frames: int) -> range:
+    return range(keyframes.scenes.indices[num_frames - 1] + 1)
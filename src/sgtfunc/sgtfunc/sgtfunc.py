@@ -1,13 +1,113 @@
 from __future__ import annotations
 
-from collections.abc import Iterable, Sequence
+from collections.abc import Iterable, Mapping, Sequence
 from pathlib import Path
-from typing import Literal, NamedTuple
+from typing import TYPE_CHECKING, Any, Literal, NamedTuple, overload
 
 from vskernels import Catrom, KernelT
 from vsmasktools import EdgeDetectT, GenericMaskT, PrewittStd
 from vstools import Keyframes, MatrixT, SceneBasedDynamicCache, SingleOrArr, vs
 
+if TYPE_CHECKING:
+    import numpy as np
+    import numpy.typing as npt
+    from vsdenoise import DeviceType, MVTools
+    from vsdenoise.bm3d import AbstractBM3D
+
+    from .framestats import FrameStatsStore
+
+
+DenoiseDevice = Literal["auto", "cuda", "cpu"]
+
+
+class DenoiseBackend(NamedTuple):
+    """
+    Plugins that `denoise()` runs on.
+    """
+
+    bm3d: type[AbstractBM3D]
+    """BM3D implementation."""
+
+    nlm_device: DeviceType
+    """Device type passed to `nl_means()`."""
+
+    @property
+    def name(self) -> str:
+        return f"{self.bm3d.__name__} + NLMeans ({self.nlm_device})"
+
+
+def denoise_backend(device: DenoiseDevice = "auto") -> DenoiseBackend:
+    """
+    Picks the BM3D and NLMeans implementations for `denoise()` from the plugins
+    that are loaded.
+
+    With `"auto"`, CUDA is preferred for each of them separately, falling back
+    to `bm3dcpu` (or `bm3d` if it isn't available) and KNLMeansCL/`nlm_ispc` on
+    the CPU. All of them implement the same algorithms, so results only differ
+    by rounding.
+
+    :param device: Restrict the selection to CUDA or CPU plugins.
+    """
+
+    from vsdenoise import BM3DCPU, BM3DCuda, BM3DCudaRTC, BM3DMawen, DeviceType
+    from vstools import core
+
+    bm3d_plugins: list[tuple[str, type[AbstractBM3D]]] = []
+    nlm_devices: list[tuple[str, DeviceType]] = []
+
+    if device in ("auto", "cuda"):
+        bm3d_plugins += [("bm3dcuda_rtc", BM3DCudaRTC), ("bm3dcuda", BM3DCuda)]
+        nlm_devices += [("nlm_cuda", DeviceType.CUDA)]
+    if device in ("auto", "cpu"):
+        bm3d_plugins += [("bm3dcpu", BM3DCPU), ("bm3d", BM3DMawen)]
+        nlm_devices += [("knlm", DeviceType.CPU), ("nlm_ispc", DeviceType.CPU)]
+
+    bm3d = next((cls for namespace, cls in bm3d_plugins if hasattr(core, namespace)), None)
+    if bm3d is None:
+        raise RuntimeError(f"No {device} BM3D plugin found (tried {', '.join(ns for ns, _ in bm3d_plugins)}).")
+
+    nlm_device = next((dt for namespace, dt in nlm_devices if hasattr(core, namespace)), None)
+    if nlm_device is None:
+        raise RuntimeError(f"No {device} NLMeans plugin found (tried {', '.join(ns for ns, _ in nlm_devices)}).")
+
+    return DenoiseBackend(bm3d, nlm_device)
+
+
+@overload
+def denoise(
+    clip: vs.VideoNode,
+    block_size: int = ...,
+    limit: int | tuple[int | None, int | None] | None = ...,
+    refine: int = ...,
+    sigma: SingleOrArr[float] = ...,
+    sr: int = ...,
+    strength: float = ...,
+    thSAD: int | tuple[int, int] = ...,  # noqa: N803
+    tr: int = ...,
+    *,
+    device: DenoiseDevice | DenoiseBackend = ...,
+    motion: MVTools | None = ...,
+    export_motion: Literal[False] = ...,
+) -> vs.VideoNode: ...
+
+
+@overload
+def denoise(
+    clip: vs.VideoNode,
+    block_size: int = ...,
+    limit: int | tuple[int | None, int | None] | None = ...,
+    refine: int = ...,
+    sigma: SingleOrArr[float] = ...,
+    sr: int = ...,
+    strength: float = ...,
+    thSAD: int | tuple[int, int] = ...,  # noqa: N803
+    tr: int = ...,
+    *,
+    device: DenoiseDevice | DenoiseBackend = ...,
+    motion: MVTools | None = ...,
+    export_motion: Literal[True],
+) -> tuple[vs.VideoNode, MVTools]: ...
+
 
 def denoise(
     clip: vs.VideoNode,
@@ -19,37 +119,94 @@ def denoise(
     strength: float = 0.2,
     thSAD: int | tuple[int, int] = 115,  # noqa: N803
     tr: int = 2,
-) -> vs.VideoNode:
+    *,
+    device: DenoiseDevice | DenoiseBackend = "auto",
+    motion: MVTools | None = None,
+    export_motion: bool = False,
+) -> vs.VideoNode | tuple[vs.VideoNode, MVTools]:
     """
     MVTools + BM3D + NLMeans denoise.
+
+    The motion analysis (DFTTest prefilter, super clip and vectors) is the
+    most expensive part of the `mc_degrain` reference. With `export_motion`,
+    it is returned alongside the denoised clip so that later temporal filters
+    can reuse it instead of searching again, and it can be passed back in as
+    `motion` to denoise another clip of the same dimensions.
+
+    Example usage::
+
+      denoised, motion = sgtfunc.denoise(clip, export_motion=True)
+      dehaloed = mc_degrain(dehaloed, vectors=motion.vectors, thsad=50)
+
+    :param device: Device to run BM3D and NLMeans on, see `denoise_backend()`.
+    :param motion: Motion analysis to reuse instead of analyzing `clip`.
+    :param export_motion: Also return the motion analysis.
     """
 
-    from vsdenoise import (
-        BM3DCudaRTC,
-        DeviceType,
-        MVToolsPresets,
-        NLMWeightMode,
-        Prefilter,
-        Profile,
-        mc_degrain,
-        nl_means,
+    stages, mv = _denoise_stages(
+        clip,
+        device if isinstance(device, DenoiseBackend) else denoise_backend(device),
+        motion,
+        block_size=block_size,
+        limit=limit,
+        refine=refine,
+        sigma=sigma,
+        sr=sr,
+        strength=strength,
+        thSAD=thSAD,
+        tr=tr,
     )
+
+    return (stages["nl_means"], mv) if export_motion else stages["nl_means"]
+
+
+def _denoise_stages(
+    clip: vs.VideoNode,
+    backend: DenoiseBackend,
+    motion: MVTools | None = None,
+    *,
+    block_size: int = 64,
+    limit: int | tuple[int | None, int | None] | None = None,
+    refine: int = 3,
+    sigma: SingleOrArr[float] = 0.7,
+    sr: int = 2,
+    strength: float = 0.2,
+    thSAD: int | tuple[int, int] = 115,  # noqa: N803
+    tr: int = 2,
+) -> tuple[dict[str, vs.VideoNode], MVTools]:
+    """
+    Builds `denoise()` and returns the output of each of its stages in order,
+    along with the motion analysis used for the reference. The defaults are
+    `denoise()`'s.
+    """
+
+    from vsdenoise import MVToolsPresets, NLMWeightMode, Prefilter, Profile, mc_degrain, nl_means
     from vstools import ChromaLocation
 
-    ref = mc_degrain(  # type: ignore[call-overload]
+    if motion is not None and (motion.clip.width, motion.clip.height, motion.clip.num_frames) != (
+        clip.width,
+        clip.height,
+        clip.num_frames,
+    ):
+        raise ValueError("The motion analysis was done on a clip with different dimensions or length.")
+
+    ref, mv = mc_degrain(  # type: ignore[call-overload]
         clip,
-        prefilter=Prefilter.DFTTEST,
+        vectors=motion.vectors if motion is not None else None,
+        # The prefilter is only used to search for vectors.
+        prefilter=Prefilter.DFTTEST if motion is None else None,
         preset=MVToolsPresets.HQ_SAD,
         blksize=block_size,
         thsad=thSAD,
         limit=limit,
         refine=refine,
+        export_globals=True,
     )
 
-    denoised_luma = BM3DCudaRTC.denoise(clip, ref=ref, sigma=sigma, tr=tr, profile=Profile.NORMAL, planes=0)
+    denoised_luma = backend.bm3d.denoise(clip, ref=ref, sigma=sigma, tr=tr, profile=Profile.NORMAL, planes=0)
     denoised_luma = ChromaLocation.ensure_presence(denoised_luma, ChromaLocation.from_video(clip, strict=True))
 
-    return nl_means(
+    denoised = nl_means(
         denoised_luma,
         ref=ref,
         strength=strength,
@@ -57,9 +214,82 @@ def denoise(
         sr=sr,
         wmode=NLMWeightMode.BISQUARE_HR,  # wmode=3
         planes=[1, 2],
-        device_type=DeviceType.CUDA,
+        device_type=backend.nlm_device,
     )
 
+    return {"mc_degrain": ref, "bm3d": denoised_luma, "nl_means": denoised}, motion if motion is not None else mv
+
+
+class DenoiseTimings(NamedTuple):
+    backend: DenoiseBackend
+    frames: int
+    seconds: dict[str, float]
+    """Seconds spent in each stage of `denoise()`."""
+
+    @property
+    def fps(self) -> float:
+        total = sum(self.seconds.values())
+        return self.frames / total if total else 0.0
+
+
+def denoise_timings(
+    clip: vs.VideoNode,
+    frames: Sequence[int] | None = None,
+    *,
+    device: DenoiseDevice | DenoiseBackend = "auto",
+    requests: int | None = None,
+    **kwargs: Any,  # noqa: ANN401
+) -> DenoiseTimings:
+    """
+    Times each stage of `denoise()` on a run of frames and prints a report, to
+    compare machines before handing out renders.
+
+    Each stage is timed by rendering a freshly built chain up to and including
+    it and subtracting the time taken by the chain before it, so that frame
+    caches aren't shared between measurements. The source frames are rendered
+    once beforehand so that decoding isn't attributed to the first stage.
+
+    :param clip: Clip to denoise.
+    :param frames: Frames to render. Defaults to 100 consecutive frames from the
+        middle of the clip, as the temporal stages work best on runs of frames.
+    :param device: Device to run BM3D and NLMeans on, see `denoise_backend()`.
+    :param requests: Maximum number of frames in flight.
+    :param kwargs: Arguments passed to `denoise()`.
+    """
+
+    import time
+
+    from .render import render_frames
+
+    backend = device if isinstance(device, DenoiseBackend) else denoise_backend(device)
+
+    if frames is None:
+        start = max(clip.num_frames // 2 - 50, 0)
+        frames = range(start, min(start + 100, clip.num_frames))
+
+    render_frames(clip, frames, lambda *_: None, requests=requests, progress="Decoding source...")
+
+    seconds = dict[str, float]()
+    previous = 0.0
+    for stage in ("mc_degrain", "bm3d", "nl_means"):
+        node = _denoise_stages(clip, backend, **kwargs)[0][stage]
+
+        start_time = time.perf_counter()
+        render_frames(node, frames, lambda *_: None, requests=requests, progress=f"Timing {stage}...")
+        elapsed = time.perf_counter() - start_time
+
+        seconds[stage] = max(elapsed - previous, 0.0)
+        previous = elapsed
+
+    timings = DenoiseTimings(backend, len(frames), seconds)
+
+    print(f"denoise on {backend.name}, {timings.frames} frames:")
+    for stage, t in seconds.items():
+        print(f"  {stage:<12}{t:8.2f} s{t / timings.frames * 1000:10.1f} ms/frame")
+    print(f"  {'total':<12}{sum(seconds.values()):8.2f} s{timings.fps:10.2f} fps")
+
+    return timings
+
 
 # Fork of `sscomp.lazylist()` without reimplementing
 # `vstools.clip_async_render()` and some typing improvements.
@@ -96,64 +326,40 @@ def lazylist(
     d_end_thresh: float = 0.380000,
     l_start_thresh: float = 0.450000,
     l_end_thresh: float = 0.750000,
+    stats: FrameStatsStore | None = None,
 ) -> list[int]:
     """
     Generates a list of frames for comparison purposes.
+
+    If `stats` is given, the plane averages are read from (and recorded to)
+    the store instead of rendering the clip.
     """
 
     import random
-    from functools import partial
-
-    from vstools import clip_async_render, core, get_prop
-
-    dark = []
-    light = []
-
-    def checkclip(n: int, f: vs.VideoFrame, clip: vs.VideoNode) -> vs.VideoNode:
-        avg: float = get_prop(f, "PlaneStatsAverage", float)
 
-        if d_start_thresh <= avg <= d_end_thresh:
-            dark.append(n)
+    import numpy as np
+    from vstools import clip_async_render, get_prop
 
-        elif l_start_thresh <= avg <= l_end_thresh:
-            light.append(n)
-
-        return clip
-
-    s_clip = clip.std.PlaneStats()
-
-    eval_frames = core.std.FrameEval(clip, partial(checkclip, clip=s_clip), prop_src=s_clip)
-    clip_async_render(eval_frames, progress="Rendering...")
-
-    dark.sort()
-    light.sort()
+    # Gather every frame's average in a single pass straight off the PlaneStats
+    # props, then do the classification on the whole array at once.
+    if stats is not None:
+        averages = stats.plane_stats()[:, 0]
+    else:
+        averages = np.asarray(
+            clip_async_render(
+                clip.std.PlaneStats(),
+                progress="Rendering...",
+                callback=lambda _, f: get_prop(f, "PlaneStatsAverage", float),
+            ),
+            dtype=np.float64,
+        )
 
-    dark_dedupe = [dark[0]]
-    light_dedupe = [light[0]]
+    is_dark = (averages >= d_start_thresh) & (averages <= d_end_thresh)
+    is_light = ~is_dark & (averages >= l_start_thresh) & (averages <= l_end_thresh)
 
     thr = round(clip.fps_num / clip.fps_den * diff_thr)
-    lastvald = dark[0]
-    lastvall = light[0]
-
-    for i in range(1, len(dark)):
-        checklist = dark[0:i]
-        x = dark[i]
-
-        for y in checklist:
-            if x >= y + thr and x >= lastvald + thr:
-                dark_dedupe.append(x)
-                lastvald = x
-                break
-
-    for i in range(1, len(light)):
-        checklist = light[0:i]
-        x = light[i]
-
-        for y in checklist:
-            if x >= y + thr and x >= lastvall + thr:
-                light_dedupe.append(x)
-                lastvall = x
-                break
+    dark_dedupe = _dedupe_min_gap(np.flatnonzero(is_dark), thr)
+    light_dedupe = _dedupe_min_gap(np.flatnonzero(is_light), thr)
 
     if len(dark_dedupe) > dark_frames:
         random.seed(seed)
@@ -166,8 +372,33 @@ def lazylist(
     return dark_dedupe + light_dedupe
 
 
+def _dedupe_min_gap(frames: npt.NDArray[np.intp], thr: int) -> list[int]:
+    """
+    Greedily keeps frames that are at least `thr` frames after the previously
+    kept frame, starting with the first one. `frames` must be sorted.
+    """
+
+    import numpy as np
+
+    if not frames.size:
+        return []
+
+    # Jump straight to the next frame that is far enough away instead of
+    # walking every frame in between.
+    kept = [0]
+    while (i := max(int(np.searchsorted(frames, frames[kept[-1]] + thr)), kept[-1] + 1)) < frames.size:
+        kept.append(i)
+
+    return frames[kept].tolist()
+
+
 def sample_ptype(
-    clips: Sequence[vs.VideoNode], n: int = 50, picture_types: Iterable[Literal["I", "P", "B"]] = {"I", "P", "B"}
+    clips: Sequence[vs.VideoNode],
+    n: int = 50,
+    picture_types: Iterable[Literal["I", "P", "B"]] = {"I", "P", "B"},
+    stats: Sequence[FrameStatsStore] | None = None,
+    *,
+    precompute: bool = False,
 ) -> list[int]:
     """
     Randomly samples `n` frame numbers from the given clips, selecting only
@@ -175,9 +406,19 @@ def sample_ptype(
     of vspreview's comp feature. One difference here is that the sampled frames
     will have the same picture type across the clips.
 
+    By default frames are rejection sampled, requesting each candidate from
+    every clip. With `precompute` (or `stats`), the picture types of every
+    frame are indexed up front instead and the samples are drawn in one go from
+    the frames whose picture types match, so there is no rejection sampling
+    limit.
+
     :param clips: Clips to sample frames from.
     :param n: Number of frames to sample. Defaults to 50.
     :param picture_types: Set of picture types to select. Defaults to all of "I", "P", and "B".
+    :param stats: Frame statistics stores for each clip. If given, the picture
+        type index is read from (and recorded to) the stores.
+    :param precompute: Index the picture types of all clips in one concurrent
+        pass before sampling.
 
     Seeding the RNG can be done beforehand::
 
@@ -194,6 +435,9 @@ def sample_ptype(
     # Work with the smallest frame range.
     num_frames = min(clip.num_frames for clip in clips)
 
+    if stats is not None or precompute:
+        return _sample_ptype_indexed(clips, num_frames, n, picture_types, stats)
+
     picture_types_b = {p.encode() for p in picture_types}
 
     # Frame numbers that have been checked already.
@@ -230,45 +474,221 @@ def sample_ptype(
     return list(samples)
 
 
+def _sample_ptype_indexed(
+    clips: Sequence[vs.VideoNode],
+    num_frames: int,
+    n: int,
+    picture_types: Iterable[str],
+    stats: Sequence[FrameStatsStore] | None,
+) -> list[int]:
+    from concurrent.futures import ThreadPoolExecutor
+    from random import sample
+
+    import numpy as np
+
+    from .framestats import read_picture_type
+    from .render import render_frames
+
+    def picture_type_index(clip: vs.VideoNode) -> npt.NDArray[np.uint8]:
+        return np.asarray(render_frames(clip, range(num_frames), read_picture_type), dtype=np.uint8)
+
+    if stats is not None:
+        if len(stats) != len(clips):
+            raise ValueError("Expected one frame statistics store per clip.")
+
+        index = np.stack([store.picture_types(range(num_frames)) for store in stats])
+    else:
+        # The clips are indexed side by side so that their decoders run
+        # concurrently.
+        with ThreadPoolExecutor(len(clips)) as executor:
+            index = np.stack(list(executor.map(picture_type_index, clips)))
+
+    # Frames where every clip agrees on one of the requested picture types.
+    matching = np.isin(index[0], [ord(p) for p in picture_types]) & (index == index[0]).all(axis=0)
+    candidates = np.flatnonzero(matching).tolist()
+
+    if len(candidates) < n:
+        raise ValueError("Could not find enough frames.")
+
+    return sample(candidates, n)
+
+
+class ScreengenStats(NamedTuple):
+    frames: int
+    """Number of images written."""
+
+    seconds: float
+    """Wall time spent rendering and writing the images."""
+
+    @property
+    def fps(self) -> float:
+        """Images written per second."""
+
+        return self.frames / self.seconds if self.seconds else 0.0
+
+
 def screengen(
-    clip: vs.VideoNode,
+    clip: vs.VideoNode | Sequence[vs.VideoNode],
     directory_path: Path,
-    prefix: str,
+    prefix: str | Sequence[str],
     frame_numbers: Sequence[int] = [],
-) -> None:
+    *,
+    requests: int | None = None,
+) -> ScreengenStats:
     """
     Writes images from a list of frames.
 
-    :param clip: Clip to fetch frames from.
+    The RGB conversion and image writer are only set up once per clip, and the
+    frames of all clips are requested concurrently so that decoding and PNG
+    encoding run on VapourSynth's thread pool.
+
+    :param clip: Clip to fetch frames from, or several clips to save the same frames of.
     :param directory_path: Path to the directory that should receive the frame images. Will be created if it does not exist.
-    :param prefix: String that each file name will begin with.
+    :param prefix: String that each file name will begin with. One per clip if several clips are given.
     :param frame_numbers: Frame numbers to save images of.
+    :param requests: Maximum number of frames in flight. Defaults to the core's thread count.
+
+    :return: Number of images written and how long it took.
+    """
+
+    clips = [clip] if isinstance(clip, vs.VideoNode) else list(clip)
+    prefixes = [prefix] if isinstance(prefix, str) else list(prefix)
+    if len(clips) != len(prefixes):
+        raise ValueError("Expected one prefix per clip.")
+
+    stats, _ = _write_images(list(zip(prefixes, clips, strict=True)), frame_numbers, directory_path, requests)
+
+    return stats
+
+
+def screengen_multi(
+    clips: Mapping[str, vs.VideoNode],
+    frame_numbers: Iterable[int],
+    directory_path: Path,
+    *,
+    requests: int | None = None,
+    manifest_name: str = "manifest.json",
+) -> ScreengenStats:
+    """
+    Writes images of the same frames from several sources, e.g. for a
+    comparison, along with a JSON manifest describing every image.
+
+    Frames are deduplicated and requested in ascending order from every source
+    at once, so each source only ever seeks forward while all of them decode
+    in parallel.
+
+    Example usage::
+
+        frames = sgtfunc.sample_ptype(list(clips.values()), n=50, precompute=True)
+        sgtfunc.screengen_multi({"ADN": adn, "AMZN": amzn, "Filtered": final}, frames, Path("comp"))
+
+    :param clips: Mapping of names to clips. The names are used as file name prefixes.
+    :param frame_numbers: Frame numbers to save images of.
+    :param directory_path: Path to the directory that should receive the frame images. Will be created if it does not exist.
+    :param requests: Maximum number of frames in flight. Defaults to the core's thread count.
+    :param manifest_name: File name of the manifest written to `directory_path`.
+
+    :return: Number of images written and how long it took.
+    """
+
+    import json
+
+    frames = sorted(set(frame_numbers))
+    stats, images = _write_images(list(clips.items()), frames, directory_path, requests)
+
+    manifest = {
+        "frames": frames,
+        "sources": {
+            name: {
+                "width": clip.width,
+                "height": clip.height,
+                "format": clip.format.name,
+                "num_frames": clip.num_frames,
+                "fps": str(clip.fps),
+            }
+            for name, clip in clips.items()
+        },
+        "images": [{"source": name, "frame": num, "path": path.name} for name, num, path in images],
+        "seconds": stats.seconds,
+    }
+    directory_path.joinpath(manifest_name).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    return stats
+
+
+def _write_images(
+    clips: Sequence[tuple[str, vs.VideoNode]],
+    frame_numbers: Sequence[int],
+    directory_path: Path,
+    requests: int | None,
+) -> tuple[ScreengenStats, list[tuple[str, int, Path]]]:
+    """
+    Writes `<prefix>-<frame number>.png` for every clip and frame, returning the
+    stats and the prefix, frame number and path of each image.
+    """
+
+    from time import perf_counter
+
+    from vstools import core
+
+    from .render import render_frames
+
+    directory_path.mkdir(parents=True, exist_ok=True)
+
+    if not clips or not frame_numbers:
+        return ScreengenStats(0, 0.0), []
+
+    writers = [(prefix, _png_writer(clip, directory_path.joinpath(prefix))) for prefix, clip in clips]
+
+    # Line up every requested image into one node so that they all share a
+    # single render loop. Interleaving the clips per frame keeps all of them
+    # decoding at the same time.
+    images = core.std.Splice([writer[num] for num in frame_numbers for _, writer in writers], mismatch=True)
+
+    start = perf_counter()
+    render_frames(
+        images,
+        range(images.num_frames),
+        lambda *_: None,
+        requests=requests,
+        progress=f"Saving frames from {', '.join(prefix for prefix, _ in clips)}...",
+    )
+    stats = ScreengenStats(images.num_frames, perf_counter() - start)
+
+    print(f"Saved {stats.frames} images in {stats.seconds:.2f}s ({stats.fps:.2f} images/s)")
+
+    return stats, [
+        (prefix, num, directory_path.joinpath(f"{prefix}-{num:05d}.png"))
+        for num in frame_numbers
+        for prefix, _ in clips
+    ]
+
+
+def _png_writer(clip: vs.VideoNode, prefix_path: Path) -> vs.VideoNode:
+    """
+    Converts `clip` to RGB and writes each requested frame to
+    `<prefix_path>-<frame number>.png`.
     """
 
     from vskernels import Catrom
     from vstools import Matrix, core
 
-    if not Path.is_dir(directory_path):
-        Path.mkdir(directory_path)
-
-    for i, num in enumerate(frame_numbers, start=1):
-        filename = directory_path.joinpath(f"{prefix}-{num:05d}.png")
-        matrix = Matrix.from_video(clip)
-        if matrix == Matrix.UNKNOWN:
-            matrix = Matrix.BT709
-
-        print(f"Saving frame {i}/{len(frame_numbers)} from {prefix}", end="\r")
-        core.imwri.Write(
-            Catrom.resample(
-                clip,
-                format=vs.RGB24,
-                matrix_in=matrix,
-                dither_type="error_diffusion",
-            ),
-            "PNG",
-            filename,
-            overwrite=True,
-        ).get_frame(num)
+    matrix = Matrix.from_video(clip)
+    if matrix == Matrix.UNKNOWN:
+        matrix = Matrix.BT709
+
+    return core.imwri.Write(
+        Catrom.resample(
+            clip,
+            format=vs.RGB24,
+            matrix_in=matrix,
+            dither_type="error_diffusion",
+        ),
+        "PNG",
+        # imwri substitutes the frame number printf-style.
+        str(prefix_path).replace("%", "%%") + "-%05d.png",
+        overwrite=True,
+    )
 
 
 def descale_errors_async(
@@ -278,22 +698,81 @@ def descale_errors_async(
     tr: int = 1,
     ref: float = 0.0002,
     range_length: int = 5,
+    *,
+    stride: int | None = None,
+    keyframes: Keyframes | None = None,
 ) -> list[tuple[int, int]]:
     """
     Finds descale errors.
+
+    By default every frame is rendered. With `stride`, only every `stride`th
+    frame (plus the first and last frame of every scene if `keyframes` is
+    given) is rendered at first, and then only the frames around those that
+    exceed `ref` are rendered to find where each range starts and ends. As long
+    as `stride` is at most `range_length + 1`, every range longer than
+    `range_length` is hit by the coarse pass, so the result is the same as
+    rendering everything. Larger strides can miss short ranges.
+
+    :param stride: Step of the coarse pass. If None, render every frame.
+    :param keyframes: Scene changes to add to the coarse pass.
+
+    :return: Inclusive `(start, end)` ranges of more than `range_length` frames
+        whose error exceeds `ref`, or the frames themselves if `range_length`
+        is 0, like `find_prop()`.
     """
 
     from vsscale import descale_error_mask
-    from vstools import find_prop
+    from vstools import find_prop, get_prop, normalize_list_to_ranges
 
-    return find_prop(
-        descale_error_mask(src, rescaled, thr=thr, tr=tr).std.PlaneStats(),
-        "PlaneStatsAverage",
-        ">",
-        ref=ref,
-        range_length=range_length,
+    from .render import render_frames
+
+    errors = descale_error_mask(src, rescaled, thr=thr, tr=tr).std.PlaneStats()
+
+    if stride is None:
+        return find_prop(errors, "PlaneStatsAverage", ">", ref=ref, range_length=range_length)
+
+    num_frames = errors.num_frames
+    exceeds = dict[int, bool]()
+
+    def evaluate(frames: Iterable[int], progress: str) -> None:
+        frames = sorted(set(frames).difference(exceeds))
+        exceeds.update(
+            zip(
+                frames,
+                render_frames(
+                    errors, frames, lambda _, f: get_prop(f, "PlaneStatsAverage", float) > ref, progress=progress
+                ),
+                strict=True,
+            )
+        )
+
+    # Coarse pass.
+    coarse = set(range(0, num_frames, stride)) | {num_frames - 1}
+    if keyframes:
+        coarse.update(n for kf in keyframes for n in (kf - 1, kf) if 0 <= n < num_frames)
+    evaluate(coarse, "Searching descale errors (coarse)...")
+
+    # Any range that contains a hit can't extend past the next coarse frame in
+    # either direction without that frame being a hit too.
+    evaluate(
+        (
+            n
+            for hit in [n for n, exceeded in exceeds.items() if exceeded]
+            for n in range(max(hit - stride + 1, 0), min(hit + stride, num_frames))
+        ),
+        "Searching descale errors (refine)...",
     )
 
+    print(f"Rendered {len(exceeds)}/{num_frames} frames ({len(exceeds) / num_frames:.1%}).")
+
+    frames = sorted(n for n, exceeded in exceeds.items() if exceeded)
+    if range_length > 0:
+        return normalize_list_to_ranges(frames, range_length)
+
+    # find_prop() returns the frames without a range length, and so did this
+    # before the coarse pass was added.
+    return frames  # type: ignore[return-value]
+
 
 def get_rescale_error(
     source: vs.VideoNode,
@@ -451,16 +930,16 @@ def adb_props(f: vs.VideoFrame) -> AdbPropsTuple:
 
 
 def avg_adb_props(clip: vs.VideoNode) -> AdbPropsTuple:
-    from statistics import fmean
+    from .render import iter_frames
+    from .streamstats import RunningStats
 
-    from vstools import clip_data_gather
+    evref_diff, y_next_diff, y_prev_diff = RunningStats(), RunningStats(), RunningStats()
+    for props in iter_frames(clip, range(clip.num_frames), lambda _, f: adb_props(f)):
+        evref_diff.push(props.evref_diff)
+        y_next_diff.push(props.y_next_diff)
+        y_prev_diff.push(props.y_prev_diff)
 
-    stats = clip_data_gather(clip, None, lambda _, f: adb_props(f))
-    return AdbPropsTuple(
-        fmean(x.evref_diff for x in stats),
-        fmean(x.y_next_diff for x in stats),
-        fmean(x.y_prev_diff for x in stats),
-    )
+    return AdbPropsTuple(evref_diff.mean, y_next_diff.mean, y_prev_diff.mean)
 
 
 class SceneBasedAdbHeuristics(SceneBasedDynamicCache):
@@ -480,13 +959,24 @@ class SceneBasedAdbHeuristics(SceneBasedDynamicCache):
         clip: vs.VideoNode,
         keyframes: Keyframes | str,
         cache_size: int = 5,
+        stats: FrameStatsStore | None = None,
     ) -> None:
+        """
+        :param stats: Frame statistics store for `clip`. If given, the per-frame
+            heuristics are read from (and recorded to) the store.
+        """
+
         super().__init__(adb_heuristics(clip), keyframes, cache_size)
+        self.stats = stats
 
     def get_clip(self, scene_idx: int) -> vs.VideoNode:
         frame_range = self.keyframes.scenes[scene_idx]
-        cut = self.clip[frame_range.start : frame_range.stop]
-        evref_diff, y_next_diff, y_prev_diff = avg_adb_props(cut)
+        if self.stats is not None:
+            scene_frames = range(frame_range.start, min(frame_range.stop, self.clip.num_frames))
+            evref_diff, y_next_diff, y_prev_diff = self.stats.adb_props(scene_frames).mean(axis=0).tolist()
+        else:
+            cut = self.clip[frame_range.start : frame_range.stop]
+            evref_diff, y_next_diff, y_prev_diff = avg_adb_props(cut)
         return self.clip.std.SetFrameProps(
             Scene_Avg_EdgeValRefDiff=evref_diff,
             Scene_Avg_YNextDiff=y_next_diff,
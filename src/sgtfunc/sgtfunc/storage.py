@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import os
+from hashlib import sha256
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from vstools import vs
+
+
+def cache_dir(name: str) -> Path:
+    """
+    Directory for one of sgtfunc's caches, `.vsjet/sgtfunc/<name>` next to the
+    running script. It isn't created.
+    """
+
+    from vstools import PackageStorage
+
+    return Path(PackageStorage(package_name="sgtfunc").folder, name)
+
+
+def fingerprint(source_file: str | os.PathLike[str] | None, *parts: object) -> str:
+    """
+    Hashes a source file's resolved path, size and modification time together
+    with arbitrary other parts into a short hex digest for use as a cache key.
+    """
+
+    items: list[object] = []
+    if source_file is not None:
+        source_path = Path(source_file).resolve()
+        source_stat = source_path.stat()
+        items += [source_path, source_stat.st_size, source_stat.st_mtime_ns]
+
+    return sha256("\0".join(str(x) for x in [*items, *parts]).encode()).hexdigest()[:32]
+
+
+def clip_info(clip: vs.VideoNode) -> tuple[object, ...]:
+    """
+    The parts of a clip that identify it without rendering anything, for use
+    with `fingerprint()`.
+    """
+
+    return (clip.format.name, clip.width, clip.height, clip.num_frames, clip.fps)
+
+
+def write_atomic(path: Path, data: str | bytes) -> None:
+    """
+    Writes to a temporary file next to `path` first so that an interrupted write
+    doesn't leave a truncated file behind.
+    """
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    temp_path = path.with_name(f"{path.name}.tmp")
+    if isinstance(data, str):
+        temp_path.write_text(data, encoding="utf-8")
+    else:
+        temp_path.write_bytes(data)
+    temp_path.replace(path)
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import math
+from collections.abc import Callable, Iterable
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from vstools import vs
+
+
+class RunningStats:
+    """
+    Streaming summary statistics in constant memory: count, min, max, mean and
+    variance (Welford's algorithm) and an approximate median (the P² algorithm
+    of Jain and Chlamtac).
+
+    With `exact`, every value is kept as well so that the median is exact and
+    the mean and standard deviation match the `statistics` module.
+
+    Example usage::
+
+      stats = RunningStats()
+      for f in clip.frames():
+          stats.push(get_prop(f, "PlaneStatsDiff", float))
+      stats.mean, stats.median, stats.stdev
+    """
+
+    __slots__ = ("_heights", "_m2", "_mean", "_positions", "_targets", "_values", "count", "exact", "max", "min")
+
+    _increments = (0.0, 0.25, 0.5, 0.75, 1.0)
+    """Per-value increments of the desired marker positions for the median."""
+
+    def __init__(self, values: Iterable[float] = (), *, exact: bool = False) -> None:
+        self.exact = exact
+
+        self.count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+        # P² markers. Until five values have been seen, they are kept sorted in
+        # `_heights` and the median is exact.
+        self._heights: list[float] = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._targets = [1.0, 2.0, 3.0, 4.0, 5.0]
+
+        self._values: list[float] | None = [] if exact else None
+
+        self.extend(values)
+
+    def push(self, x: float) -> None:
+        """
+        Adds a value.
+        """
+
+        self.count += 1
+        delta = x - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (x - self._mean)
+
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+        if self._values is not None:
+            self._values.append(x)
+        else:
+            self._push_median(x)
+
+    def extend(self, values: Iterable[float]) -> None:
+        """
+        Adds several values.
+        """
+
+        for x in values:
+            self.push(x)
+
+    @property
+    def mean(self) -> float:
+        """
+        Arithmetic mean, 0 without values.
+        """
+
+        if self._values:
+            from statistics import fmean
+
+            return fmean(self._values)
+
+        return self._mean
+
+    @property
+    def variance(self) -> float:
+        """
+        Sample variance, 0 with less than two values.
+        """
+
+        if self._values is not None and self.count >= 2:
+            from statistics import variance
+
+            return variance(self._values)
+
+        return self._m2 / (self.count - 1) if self.count >= 2 else 0.0
+
+    @property
+    def stdev(self) -> float:
+        """
+        Sample standard deviation, 0 with less than two values.
+        """
+
+        if self._values is not None and self.count >= 2:
+            from statistics import stdev
+
+            return stdev(self._values)
+
+        return math.sqrt(self.variance)
+
+    @property
+    def median(self) -> float:
+        """
+        Median, approximate after five values unless `exact` is set.
+        """
+
+        if not self.count:
+            raise ValueError("No values to compute a median of.")
+
+        if self._values is not None:
+            from statistics import median
+
+            return median(self._values)
+
+        if self.count <= 5:
+            from statistics import median
+
+            return median(self._heights)
+
+        return self._heights[2]
+
+    def _push_median(self, x: float) -> None:
+        q, n, targets = self._heights, self._positions, self._targets
+
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        # Find the cell the value falls in, extending the extremes if needed.
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            targets[i] += self._increments[i]
+
+        # Move the middle markers towards their desired positions.
+        for i in range(1, 4):
+            d = targets[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+
+                height = q[i] + step / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+
+                q[i] = height
+                n[i] += step
+
+
+def gather_stats(
+    clip: vs.VideoNode,
+    callback: Callable[[int, vs.VideoFrame], float],
+    frames: Iterable[int] | None = None,
+    *,
+    exact: bool = False,
+    requests: int | None = None,
+) -> RunningStats:
+    """
+    Renders frames of a clip (defaults to all of them) and accumulates the
+    callback's values without keeping them around.
+
+    :param clip: Clip to render.
+    :param callback: Called with each frame number and frame, returning the value to accumulate.
+    :param frames: Frame numbers to render.
+    :param exact: Keep every value for an exact median.
+    :param requests: Maximum number of frames in flight.
+    """
+
+    from .render import iter_frames
+
+    return RunningStats(
+        iter_frames(clip, range(clip.num_frames) if frames is None else frames, callback, requests=requests),
+        exact=exact,
+    )